@@ -4,16 +4,25 @@ Author: Haining Wang hw56@indiana.edu
 This module holds app setup, layout, and callbacks for VisualDTA Online.
 """
 
+import os
+import logging
+import tempfile
+import threading
 import dash
+import flask
 import pandas as pd
 import dash_core_components as dcc
 import dash_html_components as html
 from dash_extensions import Download
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 from dash_extensions.snippets import send_file
 
-from src import static
+from src import static, timing, payload
 from src.dta import DTA
+from src.cache import LRUCache, content_hash
+from src.store import UploadStore
+from src.jobs import JobRunner
 
 # for page foot
 MARKDOWN_STYLE_SMALL = {'fontFamily': 'Times', 'fontSize': 15}
@@ -57,6 +66,8 @@ Susan Herring <herring@indiana.edu> for general.
 Haining Wang <hw56@indiana.edu> for technical. 
 """
 # --------------------------------------------------APP SETUP BEGINS--------------------------------------------------
+logger = logging.getLogger(__name__)
+
 app = dash.Dash(__name__,
                 prevent_initial_callbacks=True,
                 suppress_callback_exceptions=True
@@ -65,9 +76,249 @@ app = dash.Dash(__name__,
 app.title = 'VisualDTA Online'
 
 server = app.server
+# encoded figures go into callback responses as they are, see src/payload.py
+server.after_request(payload.splice)
+
+# rendered figures, keyed by a hash of the uploaded data and the text switch
+FIGURE_CACHE_BYTES = 64 * 1024 * 1024
+figure_cache = LRUCache(FIGURE_CACHE_BYTES)
+# parsed uploads stay on the server, the browser-side `shared_file` store only holds a token
+# they are pickled to UPLOAD_STORE_DIR, which the app refuses to use unless only its own user can get in
+UPLOAD_STORE_DIR = os.environ.get('VISUALDTA_UPLOAD_DIR', os.path.join(tempfile.gettempdir(), 'visualdta_uploads'))
+UPLOAD_STORE_BYTES = 256 * 1024 * 1024
+upload_store = UploadStore(UPLOAD_STORE_DIR, UPLOAD_STORE_BYTES)
+# uploads are read and checked in background threads, the browser polls every UPLOAD_POLL_MS for progress
+UPLOAD_JOB_WORKERS = 2
+UPLOAD_POLL_MS = 500
+upload_jobs = JobRunner(UPLOAD_STORE_DIR, UPLOAD_JOB_WORKERS)
+# uploads longer than WINDOW_THRESHOLD propositions are drawn WINDOW_ROWS at a time
+WINDOW_THRESHOLD = 5000
+WINDOW_ROWS = 500
+# laid-out uploads, keyed by upload token
+LAYOUT_CACHE_BYTES = 256 * 1024 * 1024
+layout_cache = LRUCache(LAYOUT_CACHE_BYTES)
+
+
+@server.route('/cache')
+def cache_stats():
+    """
+    Reports figure cache hits, misses, and size, and how uploads' encodings were detected.
+    """
+    return flask.jsonify(figure=figure_cache.stats(),
+                         upload=upload_store.memory.stats(),
+                         layout=layout_cache.stats(),
+                         encoding=static.encoding_path_counts())
+
+
+if timing.ENABLED:
+    @server.route('/metrics')
+    def stage_metrics():
+        """
+        Reports per-stage wall time, memory, and rows in the Prometheus text format, see src/timing.py.
+        """
+        return flask.Response(timing.metrics.prometheus_text(), mimetype='text/plain; version=0.0.4')
 
 # --------------------------------------------------APP SETUP ENDS--------------------------------------------------
 
+# --------------------------------------------------RENDERING BEGINS--------------------------------------------------
+
+
+def lay_out(df):
+    """
+    Computes a DTA graph's layout and semantic distance metrics.
+    """
+    dta = DTA(df)
+    dta.process_nodes()
+    dta.process_edges()
+    return dta
+
+
+def layout_size(dta):
+    """
+    Approximates the memory held by a laid-out DTA in bytes.
+    """
+    return dta.positions.nbytes + int(dta.df.memory_usage(deep=True).sum())
+
+
+def laid_out(token):
+    """
+    Finds the layout of an upload: cached when it was uploaded, or laid out again from the stored upload if it was
+    evicted or uploaded to another worker.
+    :return: a DTA, None if the upload expired, was never made, or cannot be laid out
+    """
+    dta = layout_cache.get(token)
+    if dta is None:
+        df = upload_store.get(token)
+        if df is None:
+            return None
+        try:
+            dta = lay_out(df)
+        except (KeyError, TypeError, ValueError):
+            # the upload feedback said why
+            return None
+        layout_cache.put(token, dta, layout_size(dta))
+    return dta
+
+
+def render(dta, annotations_switch, y_range=None, uirevision=None):
+    """
+    Draws a laid-out DTA graph, or only the slice of it inside `y_range`.
+    Returns the layout, the three semantic distance metrics, and the figure encoded as JSON bytes.
+    """
+    if y_range is None:
+        figure = dta.figure_dict(annotations_switch=annotations_switch)
+    else:
+        figure = dta.window_dict(y_range, annotations_switch=annotations_switch)
+        # keep the user's pan/zoom when a new slice arrives
+        figure['layout']['uirevision'] = uirevision
+    # get background color as white
+    figure['layout']['plot_bgcolor'] = '#fff'
+    figure['layout']['paper_bgcolor'] = '#fff'
+    with timing.stage('encode_figure', rows=len(dta.positions)):
+        figure = payload.encode_figure(figure)
+    return {'positions': dta.positions,
+            'metrics': (dta.mean_semantic_distance,
+                        dta.accumulated_semantic_distance,
+                        dta.mean_semantic_distance_only_for_P),
+            'figure': figure}
+
+
+def rendered_size(rendered):
+    """
+    Approximates the memory held by a `render` result in bytes.
+    """
+    return len(rendered['figure']) + rendered['positions'].nbytes
+
+
+def show(rendered):
+    """
+    Turns a `render` result into the graph and the three metric lines.
+    """
+    mean_semantic_distance, accumulated_semantic_distance, mean_semantic_distance_only_for_P = rendered['metrics']
+    return (dcc.Graph(id='dta_figure', figure=payload.RawFigure(rendered['figure'])),
+            f'Mean Semantic Distance (all): {mean_semantic_distance}',
+            f'Accumulated Semantic Distance: {accumulated_semantic_distance}',
+            f'Mean Semantic Distance (P): {mean_semantic_distance_only_for_P}')
+
+
+def process_upload(contents, filename, token, progress):
+    """
+    Reads in, checks, and lays out an upload, as a background job, see `check_upload`.
+    Returns the feedback, and the token the upload is stored under (None if it could not be read in).
+    """
+    df = static.read_in_uploaded(contents, filename, progress=progress)
+    # 1. check if we successfully read in a dataframe
+    if not isinstance(df, pd.DataFrame):
+        return {'feedback': df, 'shared_file': None}
+    progress('checking')
+    # validation and layout share one pass over the data; the layout is cached here for the visualize click to draw
+    dta, report = static.validate_and_build(df)
+    # store the uploaded file server-side and hand the browser its token
+    upload_store.put(token, df)
+    if dta is not None:
+        layout_cache.put(token, dta, layout_size(dta))
+    return {'feedback': """🎉🎉🎉 **Successfully uploaded!** 🎉🎉🎉""" + report.to_markdown(),
+            'shared_file': token}
+
+
+def progress_feedback(stage, fraction=None):
+    """
+    Shows how far an upload job got, e.g. "parsing `[#####...............]` 25%".
+    """
+    if fraction is None:
+        return f'⏳ **Processing upload**: {stage}...'
+    done = int(fraction * 20)
+    return f"⏳ **Processing upload**: {stage} `[{'#' * done}{'.' * (20 - done)}]` {fraction:.0%}"
+
+
+def windowed(dta):
+    """
+    Whether a laid-out upload is drawn a window at a time, decided by its number of propositions alone.
+    """
+    return len(dta.positions) > WINDOW_THRESHOLD
+
+
+def first_window(dta):
+    """
+    The y range of the first WINDOW_ROWS propositions.
+    """
+    top = dta.positions[0, 1]
+    return top - WINDOW_ROWS, top
+
+
+def requested_y_range(relayout_data):
+    """
+    Reads the y range a user panned or zoomed to from a graph's relayoutData, None if it did not change.
+    """
+    if not relayout_data:
+        return None
+    if 'yaxis.range[0]' in relayout_data and 'yaxis.range[1]' in relayout_data:
+        return relayout_data['yaxis.range[0]'], relayout_data['yaxis.range[1]']
+    if 'yaxis.range' in relayout_data:
+        return tuple(relayout_data['yaxis.range'])
+    return None
+
+
+# demo datasets, keyed by dropdown value
+DEMOS = {'example_whole': './samples/whole.xlsx',
+         'example_citizen': './samples/citizen3-1.txt',
+         'example_danmu': './samples/BiliBili_comments.xlsx'}
+# dropdown value -> (file modification time, {radio value: `render` result})
+demo_cache = {}
+# one demo is laid out at a time, so threads asking for the same one do not all lay it out
+_demo_lock = threading.Lock()
+# set VISUALDTA_PRELOAD_DEMOS=0 to lay out demos on first request instead of in the background at startup
+PRELOAD_DEMOS = os.environ.get('VISUALDTA_PRELOAD_DEMOS', '1') != '0'
+
+
+def load_demo(name):
+    """
+    Returns both figure variants of a demo, keyed by the 'Show Text'/'Hide Text' radio value.
+    A demo is read and laid out on first use and again only when its file changes on disk.
+    """
+    filepath = DEMOS[name]
+    mtime = os.path.getmtime(filepath)
+    cached = demo_cache.get(name)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with _demo_lock:
+        # laid out by another thread while this one waited
+        cached = demo_cache.get(name)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        df = static.read_in_demo(filepath, os.path.basename(filepath))
+        if not isinstance(df, pd.DataFrame):
+            # `df` is feedback on why the file could not be read in
+            raise ValueError(f'Demo {name!r} could not be read in from {filepath}.')
+        dta = lay_out(df)
+        rendered = {'Show Text': render(dta, annotations_switch=True),
+                    'Hide Text': render(dta, annotations_switch=False)}
+        demo_cache[name] = (mtime, rendered)
+    return rendered
+
+
+def preload_demos(background=True):
+    """
+    Loads every demo, by default in a daemon thread, so the demo page opens warm without holding up the worker's
+    startup. gunicorn.conf.py loads them in the foreground instead, before workers are forked.
+    """
+    def preload():
+        for name in DEMOS:
+            try:
+                load_demo(name)
+            except Exception:
+                # keep loading the others, a broken demo is reported again when someone picks it
+                logger.exception('Could not preload demo %r', name)
+
+    if not background:
+        preload()
+        return None
+    thread = threading.Thread(target=preload, name='preload_demos', daemon=True)
+    thread.start()
+    return thread
+
+# --------------------------------------------------RENDERING ENDS--------------------------------------------------
+
 # --------------------------------------------------LAYOUT BEGINS--------------------------------------------------
 
 app.layout = html.Div([
@@ -178,6 +429,9 @@ def display_page(pathname):
                     dcc.Markdown(id='feedback', dedent=True,
                                  style={'fontFamily': 'monospace',
                                         'fontSize': 16}),
+                    # the token of the upload being processed, and the timer polling its progress
+                    dcc.Store(id='upload_job'),
+                    dcc.Interval(id='upload_poll', interval=UPLOAD_POLL_MS, disabled=True),
                 ]
             ),
 
@@ -280,36 +534,39 @@ def return_pdf(n_clicks):
     return send_file("./samples/template.xlsx")
 
 
-@app.callback(Output('feedback', 'children'),
-              Output('shared_file', 'data'),
+@app.callback(Output('upload_job', 'data'),
               Input('upload', 'contents'),
               Input('upload', 'filename'))
 def check_upload(contents, filename):
-    df = static.read_in_uploaded(contents, filename)
-    shared_file = None
-    # 1. check if we successfully read in a dataframe
-    if isinstance(df, pd.DataFrame):
-        feedback = """🎉🎉🎉 **Successfully uploaded!** 🎉🎉🎉"""
-        # check headings
-        # feedback += static.check_heading(df)
-        # feedback += static.check_minimal_length(df)
-        # feedback += static.check_equal_length(df)
-        # feedback += static.check_first_row(df)
-        # feedback += static.check_blank_value(df)
-        # feedback += static.check_value_type(df)
-        # feedback += static.check_order(df)
-#         feedback += """
-#
-# Please check the file regarding the above messages. Or you can process to visualize, but it may not work as expected, if at all."""
-        feedback += "No check performed."
-        # for testing purpose
-        # print(feedback)
-        # store the uploaded file
-        shared_file = df.to_json(date_format='iso', orient='split')
-    # if we did not read in a dataframe
-    else:
-        feedback = df
-    return feedback, shared_file
+    """
+    Hands an upload over to a background job, so this worker stays free while a big file is parsed; `poll_upload`
+    reports on the job.
+    """
+    if contents is None:
+        raise PreventUpdate
+    token = content_hash(contents, filename)
+    upload_jobs.submit(token, process_upload, contents, filename, token)
+    return token
+
+
+@app.callback(Output('feedback', 'children'),
+              Output('shared_file', 'data'),
+              Output('upload_poll', 'disabled'),
+              Input('upload_job', 'data'),
+              Input('upload_poll', 'n_intervals'))
+def poll_upload(token, n_intervals):
+    """
+    Shows the progress of the upload job in Step 2, then its feedback, and hands the stored upload on to Step 3.
+    """
+    status = upload_jobs.status(token)
+    if status is None:
+        # expired, or never submitted
+        return static.MD_UPLOAD_FAIL, None, True
+    if status['state'] == 'running':
+        return progress_feedback(status['stage'], status['fraction']), dash.no_update, False
+    if status['state'] == 'failed':
+        return static.MD_UPLOAD_FAIL, None, True
+    return status['result']['feedback'], status['result']['shared_file'], True
 
 
 @app.callback([Output("dta_graph", 'children'),
@@ -320,24 +577,45 @@ def check_upload(contents, filename):
                Input('shared_file', 'data'),
                Input('hide_show_button', 'value')])
 def visualize_uploaded(n_clicks, data, hide_show):
-    df = pd.read_json(data, orient='split')
-
-    dta = DTA(df)
-    dta.process_nodes()
-    dta.process_edges()
-    if hide_show == 'Show Text':
-        fig = dta.draw_graph(annotations_switch=True)
-    else:
-        fig = dta.draw_graph(annotations_switch=False)
-    # get background color as white
-    fig.layout.plot_bgcolor = '#fff'
-    fig.layout.paper_bgcolor = '#fff'
-
     if n_clicks:
-        return (dcc.Graph(figure=fig),
-                f'Mean Semantic Distance (all): {dta.mean_semantic_distance}',
-                f'Accumulated Semantic Distance: {dta.accumulated_semantic_distance}',
-                f'Mean Semantic Distance (P): {dta.mean_semantic_distance_only_for_P}')
+        # toggling text or visualizing the same upload again is a cache lookup
+        key = content_hash(data, hide_show)
+        rendered = figure_cache.get(key)
+        if rendered is None:
+            dta = laid_out(data)
+            if dta is None:
+                raise PreventUpdate
+            if windowed(dta):
+                # long conversations are sent a window at a time, see `pan_uploaded`
+                rendered = render(dta, annotations_switch=hide_show == 'Show Text',
+                                  y_range=first_window(dta), uirevision=data)
+            else:
+                rendered = render(dta, annotations_switch=hide_show == 'Show Text')
+            figure_cache.put(key, rendered, rendered_size(rendered))
+        return show(rendered)
+
+
+@app.callback(Output('dta_figure', 'figure'),
+              Input('dta_figure', 'relayoutData'),
+              State('shared_file', 'data'),
+              State('hide_show_button', 'value'))
+def pan_uploaded(relayout_data, data, hide_show):
+    dta = laid_out(data)
+    if dta is None or not windowed(dta):
+        # not a windowed graph, plotly pans and zooms the whole figure by itself
+        raise PreventUpdate
+    if relayout_data and relayout_data.get('yaxis.autorange'):
+        y_range = first_window(dta)
+    else:
+        y_range = requested_y_range(relayout_data)
+    if y_range is None:
+        raise PreventUpdate
+    # fetch half a window more on each side, so short pans still find propositions to show
+    low, high = min(y_range), max(y_range)
+    padding = (high - low) / 2
+    rendered = render(dta, annotations_switch=hide_show == 'Show Text',
+                      y_range=(low - padding, high + padding), uirevision=data)
+    return payload.RawFigure(rendered['figure'])
 
 
 @app.callback([Output('drop_down_show_graph', 'children'),
@@ -347,34 +625,18 @@ def visualize_uploaded(n_clicks, data, hide_show):
               [Input('dropdown', 'value'),
                Input('hide_show_button_demo', 'value')])
 def visualize_demo(dropdown, hide_show):
-    if dropdown == 'example_whole':
-        df = pd.read_excel('./samples/whole.xlsx')
-    elif dropdown == 'example_citizen':
-        df = pd.read_csv('./samples/citizen3-1.txt', delimiter='\t')
-    elif dropdown == 'example_danmu':
-        df = pd.read_excel('./samples/BiliBili_comments.xlsx')
-    else:
-        pass
-    dta = DTA(df)
-    dta.process_nodes()
-    dta.process_edges()
-    if hide_show == 'Show Text':
-        fig = dta.draw_graph(annotations_switch=True)
-    else:
-        fig = dta.draw_graph(annotations_switch=False)
-    # get background color as white
-    fig.layout.plot_bgcolor = '#fff'
-    fig.layout.paper_bgcolor = '#fff'
-
-    return (dcc.Graph(figure=fig),
-            f'Mean Semantic Distance (all): {dta.mean_semantic_distance}',
-            f'Accumulated Semantic Distance: {dta.accumulated_semantic_distance}',
-            f'Mean Semantic Distance (P): {dta.mean_semantic_distance_only_for_P}'
-            )
+    if dropdown not in DEMOS:
+        raise PreventUpdate
+    # switching demos or toggling text is an in-memory lookup
+    return show(load_demo(dropdown)[hide_show])
 
 
 # --------------------------------------------------CALLBACKS END--------------------------------------------------
 
+# the worker is ready once this module is imported
+if PRELOAD_DEMOS:
+    preload_demos()
+
 if __name__ == '__main__':
     app.run_server(debug=False,
                    use_reloader=False,
@@ -0,0 +1,40 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+Benchmarks DTA.process_edges, and laying out the edges' coordinates for drawing, from 100 to 100k propositions.
+Run from the repository root: python -m benchmarks.bench_edges
+"""
+
+
+import argparse
+import time
+
+from src.dta import DTA
+from benchmarks.synthetic import make_transcript
+
+SIZES = [100, 1000, 10000, 100000]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'edges':>8} {'best (s)':>10} {'per row (us)':>13}")
+    for n in args.sizes:
+        df = make_transcript(n)
+        best = float('inf')
+        for _ in range(args.repeat):
+            dta = DTA(df.copy())
+            dta.process_nodes()
+            start = time.perf_counter()
+            dta.process_edges()
+            # coordinates are laid out when first drawn
+            dta.edge_x
+            best = min(best, time.perf_counter() - start)
+        print(f"{n:>8} {len(dta.array_graph.edges()[0]):>8} {best:>10.4f} {best / n * 1e6:>13.2f}")
+
+
+if __name__ == '__main__':
+    main()
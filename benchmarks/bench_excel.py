@@ -0,0 +1,62 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+Benchmarks reading a transcript as .xlsx with pandas' default reader, with static.read_excel_fast (fresh and from its
+columnar cache), and as .tsv with static.read_transcript_chunks. The workbooks carry a few extra coder columns, as
+real ones do.
+Run from the repository root: python -m benchmarks.bench_excel
+"""
+
+
+import os
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from src import static
+from benchmarks.synthetic import make_transcript
+
+SIZES = [1000, 10000, 50000]
+EXTRA_COLUMNS = ['Coder', 'Notes', 'Timestamp']
+
+
+def best_of(repeat, read):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        read()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'read_excel (s)':>15} {'fast (s)':>9} {'cached (s)':>11} {'tsv (s)':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for n in args.sizes:
+            df = make_transcript(n)
+            for column in EXTRA_COLUMNS:
+                df[column] = np.arange(n).astype(str)
+            xlsx = os.path.join(directory, f'{n}.xlsx')
+            tsv = os.path.join(directory, f'{n}.tsv')
+            df.to_excel(xlsx, index=False)
+            df.to_csv(tsv, sep='\t', index=False)
+            cache_dir = os.path.join(directory, 'cache')
+            static.read_excel_fast(xlsx, cache_dir=cache_dir)
+            timings = [best_of(args.repeat, lambda: pd.read_excel(xlsx)),
+                       best_of(args.repeat, lambda: static.read_excel_fast(xlsx)),
+                       best_of(args.repeat, lambda: static.read_excel_fast(xlsx, cache_dir=cache_dir)),
+                       best_of(args.repeat, lambda: static.concat_chunks(
+                           static.read_transcript_chunks(tsv, delimiter='\t', text=True)))]
+            print(f'{n:>8} {timings[0]:>15.3f} {timings[1]:>9.3f} {timings[2]:>11.3f} {timings[3]:>8.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+Benchmarks the cold-start import of the app (what a gunicorn worker pays before serving its first request) by parsing
+`python -X importtime` in fresh interpreters, and lists the slowest top-level packages.
+Fails (exit status 1) if the best time exceeds --max-seconds, or if a module meant to load lazily is imported.
+Run from the repository root: python -m benchmarks.bench_import
+"""
+
+
+import os
+import re
+import sys
+import argparse
+import subprocess
+
+# deferred until first use, must not be imported at startup
+LAZY_MODULES = ['networkx', 'chardet', 'openpyxl', 'xlrd']
+LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def import_times(module):
+    """
+    Imports `module` in a fresh interpreter.
+    :return: {module name: (self us, cumulative us, depth)}
+    """
+    env = dict(os.environ, VISUALDTA_PRELOAD_DEMOS='0')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    times = {}
+    for match in LINE.finditer(result.stderr):
+        times[match.group(4)] = (int(match.group(1)), int(match.group(2)), (len(match.group(3)) - 1) // 2)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='slowest top-level packages to list')
+    parser.add_argument('--max-seconds', type=float, help='fail if the best import time exceeds this')
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.repeat)]
+    best = min(runs, key=lambda times: times[args.module][1])
+    total = best[args.module][1] / 1e6
+    print(f'import {args.module}: best {total:.3f} s of {args.repeat}')
+
+    print(f"{'package':>28} {'cumulative (s)':>15}")
+    top_level = [(name, cumulative) for name, (_, cumulative, depth) in best.items() if depth == 1]
+    for name, cumulative in sorted(top_level, key=lambda item: -item[1])[:args.top]:
+        print(f'{name:>28} {cumulative / 1e6:>15.3f}')
+
+    status = 0
+    eager = [name for name in LAZY_MODULES if name in best]
+    if eager:
+        print(f'imported at startup: {eager}')
+        status = 1
+    if args.max_seconds is not None and total > args.max_seconds:
+        print(f'{total:.3f} s exceeds {args.max_seconds:.3f} s')
+        status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
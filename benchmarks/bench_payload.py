@@ -0,0 +1,59 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+Benchmarks sending a figure to the browser: the earlier path (draw_graph builds and validates a go.Figure, to_json
+encodes it, and Dash encodes the decoded figure again with plotly's encoder) against DTA.figure_dict encoded once with
+orjson by payload.encode_figure. Reports build and encode time and the bytes on the wire, before and after gzip.
+Run from the repository root: python -m benchmarks.bench_payload
+"""
+
+
+import gzip
+import json
+import time
+import argparse
+
+import plotly
+
+from src import payload
+from src.dta import DTA
+from benchmarks.synthetic import make_transcript
+
+SIZES = [1000, 5000, 20000]
+
+
+def legacy(dta, annotations_switch, high_volume):
+    fig = dta.draw_graph(annotations_switch, high_volume=high_volume)
+    built = time.perf_counter()
+    body = json.dumps(json.loads(fig.to_json()), cls=plotly.utils.PlotlyJSONEncoder).encode('utf-8')
+    return built, body
+
+
+def direct(dta, annotations_switch, high_volume):
+    figure = dta.figure_dict(annotations_switch, high_volume=high_volume)
+    built = time.perf_counter()
+    return built, payload.encode_figure(figure)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--hide-text', action='store_true', help='draw without text')
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'mode':>12} {'path':>7} {'build (s)':>10} {'encode (s)':>11} {'bytes (MB)':>11} {'gzip (MB)':>10}")
+    for n in args.sizes:
+        dta = DTA(make_transcript(n))
+        dta.process_nodes()
+        dta.process_edges()
+        for mode, high_volume in [('standard', False), ('high-volume', True)]:
+            for path, send in [('legacy', legacy), ('direct', direct)]:
+                start = time.perf_counter()
+                built, body = send(dta, not args.hide_text, high_volume)
+                encoded = time.perf_counter()
+                print(f'{n:>8} {mode:>12} {path:>7} {built - start:>10.3f} {encoded - built:>11.3f} '
+                      f'{len(body) / 1e6:>11.2f} {len(gzip.compress(body, 6)) / 1e6:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
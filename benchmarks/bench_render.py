@@ -0,0 +1,40 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+Benchmarks DTA.draw_graph in the standard (SVG traces, text as annotations) and high-volume (WebGL traces, text on
+hover) modes: figure construction time and figure JSON size.
+Run from the repository root: python -m benchmarks.bench_render
+"""
+
+
+import argparse
+import time
+
+from src.dta import DTA
+from benchmarks.synthetic import make_transcript
+
+SIZES = [1000, 10000, 50000]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--hide-text', action='store_true', help='draw without text')
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'mode':>12} {'build (s)':>10} {'to_json (s)':>12} {'JSON (MB)':>10}")
+    for n in args.sizes:
+        dta = DTA(make_transcript(n))
+        dta.process_nodes()
+        dta.process_edges()
+        for mode, high_volume in [('standard', False), ('high-volume', True)]:
+            start = time.perf_counter()
+            fig = dta.draw_graph(not args.hide_text, high_volume=high_volume)
+            built = time.perf_counter()
+            payload = fig.to_json()
+            encoded = time.perf_counter()
+            print(f"{n:>8} {mode:>12} {built - start:>10.3f} {encoded - built:>12.3f} {len(payload) / 1e6:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
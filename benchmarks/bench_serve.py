@@ -0,0 +1,215 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+Load-tests the app under gunicorn: the earlier setup (sync workers, `gunicorn app:server`) against gunicorn.conf.py
+(gthread workers, preload_app). A synthetic transcript is uploaded through the Dash callbacks, then for a fixed time
+client threads click 'Visualize Topic Flow' for it, toggling the text (a cache hit once each worker has rendered it),
+while a few others pan around the graph, which renders a new window every time. Reports requests/sec and latency
+percentiles of the clicks, pans/sec, and the memory of the server's processes (proportional set size, so pages shared
+copy-on-write are counted once).
+Run from the repository root: python -m benchmarks.bench_serve --workers 2 --threads 4 --clients 16 --panners 2
+"""
+
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import subprocess
+import urllib.request
+import urllib.error
+
+from benchmarks.synthetic import make_transcript
+
+MODES = ['sync', 'gthread']
+UPDATE = '/_dash-update-component'
+VISUALIZE_OUTPUTS = ['dta_graph', 'mean_semantic_distance', 'accumulated_semantic_distance',
+                     'mean_semantic_distance_only_for_P']
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def post(url, body, timeout=60):
+    request = urllib.request.Request(url, data=json.dumps(body).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read()
+
+
+def callback(outputs, inputs, changed, state=()):
+    """
+    A Dash 1.x callback request body.
+    :param outputs: [(id, property)]
+    :param inputs: [(id, property, value)]
+    :param state: [(id, property, value)]
+    """
+    if len(outputs) == 1:
+        output = '{}.{}'.format(*outputs[0])
+        outputs_list = {'id': outputs[0][0], 'property': outputs[0][1]}
+    else:
+        output = '..' + '...'.join('{}.{}'.format(*o) for o in outputs) + '..'
+        outputs_list = [{'id': i, 'property': p} for i, p in outputs]
+    return {'output': output,
+            'outputs': outputs_list,
+            'inputs': [{'id': i, 'property': p, 'value': v} for i, p, v in inputs],
+            'state': [{'id': i, 'property': p, 'value': v} for i, p, v in state],
+            'changedPropIds': [changed]}
+
+
+def upload(base, rows):
+    """
+    Uploads a synthetic transcript and waits for its job, returning the token of the stored upload.
+    """
+    import base64
+    contents = 'data:text/csv;base64,' + base64.b64encode(make_transcript(rows).to_csv(index=False).encode()).decode()
+    response = post(base + UPDATE, callback([('upload_job', 'data')],
+                                            [('upload', 'contents', contents), ('upload', 'filename', 'bench.csv')],
+                                            'upload.contents'))
+    token = json.loads(response)['response']['upload_job']['data']
+    for n in range(600):
+        response = json.loads(post(base + UPDATE, callback([('feedback', 'children'), ('shared_file', 'data'),
+                                                            ('upload_poll', 'disabled')],
+                                                           [('upload_job', 'data', token),
+                                                            ('upload_poll', 'n_intervals', n)],
+                                                           'upload_poll.n_intervals')))['response']
+        if response['upload_poll']['disabled']:
+            return response['shared_file']['data']
+        time.sleep(0.2)
+    raise RuntimeError('upload did not finish')
+
+
+def visualize(base, token, hide_show):
+    post(base + UPDATE, callback([(i, 'children') for i in VISUALIZE_OUTPUTS],
+                                 [('visualize', 'n_clicks', 1), ('shared_file', 'data', token),
+                                  ('hide_show_button', 'value', hide_show)],
+                                 'visualize.n_clicks'))
+
+
+def pan(base, token, low):
+    post(base + UPDATE, callback([('dta_figure', 'figure')],
+                                 [('dta_figure', 'relayoutData', {'yaxis.range[0]': low, 'yaxis.range[1]': low + 300})],
+                                 'dta_figure.relayoutData',
+                                 [('shared_file', 'data', token), ('hide_show_button', 'value', 'Show Text')]))
+
+
+def memory(pid):
+    """
+    Sums the proportional set size of a process and its children in MB, None where /proc does not tell.
+    """
+    pids = [pid]
+    try:
+        for task in os.listdir(f'/proc/{pid}/task'):
+            with open(f'/proc/{pid}/task/{task}/children') as f:
+                pids.extend(int(child) for child in f.read().split())
+        total = 0
+        for p in pids:
+            with open(f'/proc/{p}/smaps_rollup') as f:
+                for line in f:
+                    if line.startswith('Pss:'):
+                        total += int(line.split()[1])
+        return total / 1024
+    except OSError:
+        return None
+
+
+def serve(mode, port, workers, threads):
+    command = [sys.executable, '-m', 'gunicorn', 'app:server', '--bind', f'127.0.0.1:{port}', '--workers', str(workers)]
+    if mode == 'gthread':
+        command += ['--config', 'gunicorn.conf.py', '--threads', str(threads)]
+    else:
+        # gunicorn reads ./gunicorn.conf.py unless told otherwise
+        command += ['--config', os.devnull]
+    return subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def run(mode, args):
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    server = serve(mode, port, args.workers, args.threads)
+    try:
+        for _ in range(300):
+            try:
+                urllib.request.urlopen(base + '/', timeout=5).read()
+                break
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.2)
+        token = upload(base, args.rows)
+        # every worker renders both variants once before the clock starts
+        for _ in range(2 * args.workers):
+            visualize(base, token, 'Show Text')
+            visualize(base, token, 'Hide Text')
+
+        latencies, errors, pans = [], [0], [0]
+        lock = threading.Lock()
+        stop = time.perf_counter() + args.seconds
+
+        def panner(i):
+            low = 500.0 * i
+            while time.perf_counter() < stop:
+                try:
+                    pan(base, token, low % args.rows)
+                except (urllib.error.URLError, ConnectionError, socket.timeout):
+                    with lock:
+                        errors[0] += 1
+                    continue
+                with lock:
+                    pans[0] += 1
+                low += 150.0
+
+        def client(i):
+            n = 0
+            while time.perf_counter() < stop:
+                start = time.perf_counter()
+                try:
+                    visualize(base, token, 'Show Text' if (i + n) % 2 else 'Hide Text')
+                except (urllib.error.URLError, ConnectionError, socket.timeout):
+                    with lock:
+                        errors[0] += 1
+                    continue
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+                n += 1
+
+        clients = ([threading.Thread(target=client, args=(i,)) for i in range(args.clients)] +
+                   [threading.Thread(target=panner, args=(i,)) for i in range(args.panners)])
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        latencies.sort()
+        percentile = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else float('nan')
+        return (len(latencies) / args.seconds, percentile(0.5), percentile(0.95), pans[0] / args.seconds, errors[0],
+                memory(server.pid))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help='threads per gthread worker')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent client threads')
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--panners', type=int, default=2, help='concurrent client threads panning around')
+    parser.add_argument('--rows', type=int, default=20000,
+                        help='propositions in the uploaded transcript, more than app.WINDOW_THRESHOLD to pan')
+    parser.add_argument('--modes', nargs='+', default=MODES, choices=MODES)
+    args = parser.parse_args()
+
+    print(f"{'mode':>8} {'req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'pans/s':>7} {'errors':>7} {'PSS (MB)':>9}")
+    for mode in args.modes:
+        rate, p50, p95, pan_rate, errors, pss = run(mode, args)
+        pss = 'n/a' if pss is None else f'{pss:.0f}'
+        print(f'{mode:>8} {rate:>8.1f} {p50:>9.1f} {p95:>9.1f} {pan_rate:>7.1f} {errors:>7} {pss:>9}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+Benchmarks peak memory of reading an uploaded transcript: the earlier path (split the data URL, decode base64 to bytes,
+bytes to str, parse a StringIO) against static.read_in_uploaded (decode base64 in chunks into a BytesIO, parse it with
+an explicit encoding, chunk by chunk into compact dtypes). Each path runs in a fresh interpreter; peak RSS is reported above the baseline after the data
+URL is built.
+Run from the repository root: python -m benchmarks.bench_upload --megabytes 50
+"""
+
+
+import sys
+import argparse
+import subprocess
+
+MODES = ['legacy', 'chunked']
+
+WORKER = '''
+import io, sys, time, base64, resource
+from benchmarks.synthetic import make_transcript
+from src import static
+import pandas as pd
+
+megabytes, mode, suffix = float(sys.argv[1]), sys.argv[2], sys.argv[3]
+sep = '\\t' if suffix == 'tsv' else ','
+row_bytes = len(make_transcript(1000).to_csv(index=False, sep=sep)) / 1000
+raw = make_transcript(int(megabytes * 1e6 / row_bytes)).to_csv(index=False, sep=sep).encode('utf-8')
+contents = 'data:text/csv;base64,' + base64.b64encode(raw).decode('ascii')
+del raw
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+if mode == 'legacy':
+    content_type, content_string = contents.split(',')
+    decoded = base64.b64decode(content_string)
+    df = pd.read_csv(io.StringIO(decoded.decode('utf-8')), delimiter=sep)
+else:
+    df = static.read_in_uploaded(contents, 'upload.' + suffix)
+elapsed = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(len(df), elapsed, (peak - baseline) / 1024)
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--megabytes', type=float, default=50.0, help='size of the uploaded file')
+    parser.add_argument('--suffix', default='csv', choices=['csv', 'tsv'])
+    args = parser.parse_args()
+
+    print(f"{'mode':>8} {'rows':>10} {'time (s)':>9} {'peak above baseline (MB)':>25}")
+    for mode in MODES:
+        result = subprocess.run([sys.executable, '-c', WORKER, str(args.megabytes), mode, args.suffix],
+                                stdout=subprocess.PIPE, text=True, check=True)
+        rows, elapsed, peak = result.stdout.split()
+        print(f'{mode:>8} {rows:>10} {float(elapsed):>9.3f} {float(peak):>25.1f}')
+
+
+if __name__ == '__main__':
+    main()
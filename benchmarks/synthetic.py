@@ -0,0 +1,35 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+This module holds a generator of synthetic, well-formed transcripts for benchmarking.
+"""
+
+
+import numpy as np
+import pandas as pd
+
+RELATION_TYPES = ['T', 'P', 'B', 'X', 'PR']
+RELATION_WEIGHTS = [0.4, 0.35, 0.1, 0.1, 0.05]
+
+
+def make_transcript(n, seed=0):
+    """
+    Makes a coded transcript of `n` propositions shaped like the files in ./samples.
+    Every proposition responds to one of the last 50 propositions, distances are consistent with relation types.
+    """
+    rng = np.random.default_rng(seed)
+    relation_type = rng.choice(RELATION_TYPES, size=n, p=RELATION_WEIGHTS).astype(object)
+    distance = np.where(relation_type == 'T', 0, np.where(relation_type == 'B', 4, rng.integers(1, 4, n))).astype(float)
+    idx = np.arange(n)
+    responds_to = (idx - rng.integers(1, 51, n)).clip(0).astype(float)
+    # the root responds to nothing
+    responds_to[0] = np.nan
+    relation_type[0] = np.nan
+    distance[0] = np.nan
+    return pd.DataFrame({'Proposition': idx,
+                         'Speaker': rng.choice(['A', 'B', 'C', 'D'], n),
+                         'Responds To': responds_to,
+                         'Relation Type': relation_type,
+                         'Distance': distance,
+                         'Line Type': rng.integers(0, 3, n),
+                         'Text': [f'proposition {i}' for i in range(n)]})
@@ -0,0 +1,30 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+This module holds the gunicorn settings VisualDTA is served with (see Procfile): a few worker processes with several
+threads each. The app is imported once in the master before workers are forked, so pandas, plotly, and the demos laid
+out at startup are shared copy-on-write rather than loaded by every worker.
+Worker and thread counts can be set with WEB_CONCURRENCY and GUNICORN_THREADS.
+"""
+
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+preload_app = True
+# big uploads are parsed in background jobs, but a first render of a long conversation can take a while
+timeout = 120
+# demos are laid out in the master, see `when_ready`, rather than in a thread of each worker
+os.environ.setdefault('VISUALDTA_PRELOAD_DEMOS', '0')
+
+
+def when_ready(server):
+    """
+    Lays out the demos once in the master, before workers are forked, so every worker starts with them.
+    """
+    if server.cfg.preload_app:
+        import app
+        app.preload_demos(background=False)
@@ -0,0 +1,166 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+This module holds the command-line batch pipeline: it lays out every transcript in a directory (or matching a glob)
+across a process pool and writes one table of per-file semantic distance metrics.
+
+Usage (from the repository root):
+    python -m src.batch samples/ -o metrics.csv --jobs 4
+    python -m src.batch "corpus/**/*.xlsx" -o metrics.csv --export-dir figures --export-format html
+"""
+
+
+import os
+import sys
+import glob
+import argparse
+import functools
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from src import static
+from src.dta import DTA
+from src.files import private_directory
+
+SUFFIXES = ('.csv', '.tsv', '.txt', '.xlsx', '.xls')
+COLUMNS = ['file', 'propositions', 'accumulated_semantic_distance', 'mean_semantic_distance',
+           'mean_semantic_distance_only_for_P', 'error']
+
+
+def find_transcripts(pattern, recursive=False):
+    """
+    Lists transcripts in a directory, or matching a glob, in sorted order.
+    Excel lock files (~$...) are skipped.
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, '**', '*') if recursive else os.path.join(pattern, '*')
+        recursive = True
+    paths = [path for path in glob.glob(pattern, recursive=recursive)
+             if os.path.isfile(path)
+             and path.lower().endswith(SUFFIXES)
+             and not os.path.basename(path).startswith('~$')]
+    return sorted(paths)
+
+
+def process_transcript(filepath, export_dir=None, export_format='html', annotations_switch=True, cache_dir=None):
+    """
+    Reads in a transcript and lays it out. Runs in a worker process.
+    Returns one row of the metrics table; failures are reported in its `error` column instead of raised.
+    """
+    record = dict.fromkeys(COLUMNS)
+    record['file'] = filepath
+    try:
+        df = static.read_in_file(filepath, cache_dir=cache_dir)
+        dta = DTA(df)
+        dta.process_nodes()
+        dta.process_edges()
+        record.update(propositions=len(dta.positions),
+                      accumulated_semantic_distance=dta.accumulated_semantic_distance,
+                      mean_semantic_distance=dta.mean_semantic_distance,
+                      mean_semantic_distance_only_for_P=dta.mean_semantic_distance_only_for_P)
+        if export_dir is not None:
+            fig = dta.draw_graph(annotations_switch)
+            fig.layout.plot_bgcolor = '#fff'
+            fig.layout.paper_bgcolor = '#fff'
+            export_path = os.path.join(export_dir, f'{os.path.splitext(os.path.basename(filepath))[0]}.{export_format}')
+            if export_format == 'html':
+                fig.write_html(export_path)
+            else:
+                # png/svg/pdf need kaleido
+                fig.write_image(export_path)
+    except Exception as e:
+        record['error'] = f'{type(e).__name__}: {e}'
+    return record
+
+
+def run(paths, jobs=1, export_dir=None, export_format='html', annotations_switch=True, progress=None, cache_dir=None):
+    """
+    Processes `paths` on `jobs` worker processes and returns the metrics table, one row per file in the order of
+    `paths` whatever the number of workers.
+    :param progress: called with (number done, total, record) after each file, optional
+    :param cache_dir: keep parsed .xlsx files here, so later runs over the same files skip parsing, optional; the
+                      files are pickles, so the directory has to be private to this user, see `read_excel_fast`
+    """
+    if export_dir is not None:
+        os.makedirs(export_dir, exist_ok=True)
+    if cache_dir is not None:
+        # refuse an untrusted cache up front rather than have every file fail to read
+        private_directory(cache_dir)
+    worker = functools.partial(process_transcript,
+                               export_dir=export_dir,
+                               export_format=export_format,
+                               annotations_switch=annotations_switch,
+                               cache_dir=cache_dir)
+    records = []
+    if jobs == 1:
+        results = map(worker, paths)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        # hand files out in chunks, a few per worker, to amortize inter-process overhead on small transcripts
+        chunksize = max(1, len(paths) // (4 * jobs))
+        results = executor.map(worker, paths, chunksize=chunksize)
+    try:
+        for record in results:
+            records.append(record)
+            if progress is not None:
+                progress(len(records), len(paths), record)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    table = pd.DataFrame(records, columns=COLUMNS)
+    table['propositions'] = table['propositions'].astype('Int64')
+    return table
+
+
+def write_table(table, output):
+    """
+    Writes the metrics table as csv, tsv, or xlsx, by suffix.
+    """
+    if output.endswith('.xlsx'):
+        table.to_excel(output, index=False)
+    elif output.endswith(('.tsv', '.txt')):
+        table.to_csv(output, sep='\t', index=False)
+    else:
+        table.to_csv(output, index=False)
+
+
+def print_progress(done, total, record):
+    status = 'failed: ' + record['error'] if record['error'] else 'ok'
+    print(f"[{done}/{total}] {record['file']} {status}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compute semantic distance metrics for a corpus of DTA transcripts.')
+    parser.add_argument('input', help='a directory or a glob, e.g. "corpus/**/*.xlsx"')
+    parser.add_argument('-o', '--output', default='metrics.csv', help='metrics table (.csv, .tsv, or .xlsx)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('-r', '--recursive', action='store_true', help='search a directory recursively')
+    parser.add_argument('--export-dir', help='also save one figure per transcript here')
+    parser.add_argument('--export-format', default='html', choices=['html', 'png', 'svg', 'pdf'],
+                        help='figure format, png/svg/pdf need kaleido')
+    parser.add_argument('--hide-text', action='store_true', help='export figures without text')
+    parser.add_argument('--cache-dir', help='cache parsed .xlsx files here for later runs, a directory only you can write to')
+    parser.add_argument('-q', '--quiet', action='store_true', help='no progress report')
+    args = parser.parse_args(argv)
+
+    paths = find_transcripts(args.input, args.recursive)
+    if not paths:
+        parser.error(f'no transcripts found in {args.input}')
+    table = run(paths,
+                jobs=max(1, args.jobs),
+                export_dir=args.export_dir,
+                export_format=args.export_format,
+                annotations_switch=not args.hide_text,
+                progress=None if args.quiet else print_progress,
+                cache_dir=args.cache_dir)
+    write_table(table, args.output)
+    failed = table.error.notna().sum()
+    print(f'{len(table) - failed} of {len(table)} transcripts processed, metrics written to {args.output}',
+          file=sys.stderr)
+    return 1 if failed == len(table) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+This module holds a size-bounded LRU cache for rendered figures.
+"""
+
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def content_hash(*parts):
+    """
+    Hashes strings (e.g., the uploaded data and render options) into a cache key.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        # separate parts, so ('ab', 'c') and ('a', 'bc') differ
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+class LRUCache(object):
+    """
+    Least-recently-used cache bounded by the total size in bytes of its values.
+    The caller reports each value's size when storing it. Safe to share between threads.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (value, nbytes), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Returns the value stored under `key` and marks it as recently used, `default` if absent.
+        """
+        with self._lock:
+            try:
+                value, _ = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, nbytes):
+        """
+        Stores `value` under `key`, evicting least recently used entries until the cache fits in `max_bytes`.
+        A value larger than `max_bytes` is not stored.
+        """
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """
+        Returns hit/miss counters and the current size.
+        """
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'entries': len(self._entries),
+                    'bytes': self.current_bytes,
+                    'max_bytes': self.max_bytes}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
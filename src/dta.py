@@ -8,8 +8,11 @@ This module holds DTA class.
 import warnings
 import numpy as np
 import pandas as pd
-import networkx as nx
+import plotly.io as pio
 import plotly.graph_objects as go
+from src.graph import ArrayGraph, GrowableArray
+from src.metrics import SemanticDistanceMetrics
+from src.timing import timed
 warnings.simplefilter("ignore")
 
 # reduced fool-proof
@@ -18,6 +21,30 @@ UNKNOWN = ['n/a', 'N/A', 'na', 'NA', '', np.nan, 'unknown', 'UNKNOWN', '?', '??'
 NO_LINE = [0, 'no', 'n', 'No', 'NO', 'N']
 SOLID_LINE = [1, 'yes', 'y', 'Yes', 'YES', 'Y']
 DOTTED_LINE = [2, 'SOLID', 'solid', 'solid line', 'SOLID LINE', 'SOLID_LINE', 'solid_line']
+# relation types drawn as node traces, in legend order; the root is drawn with ROOT_RELATION_TYPE
+RELATION_TYPES = {
+    'PR': {'name': 'prompt', 'marker': {'symbol': 'square', 'color': 'yellow'}},
+    'T': {'name': 'Narrowly on-topic (T)', 'marker': {'color': 'blue'}},
+    'P': {'name': 'Parallel Shift (P)', 'marker': {'color': 'red'}},
+    'B': {'name': 'Break (B)', 'marker': {'color': 'green'}},
+    'X': {'name': 'Flexible (X)', 'marker': {'color': 'purple'}},
+}
+ROOT_RELATION_TYPE = 'PR'
+# above this many propositions, draw_graph switches to WebGL traces and moves text into hover labels
+HIGH_VOLUME_THRESHOLD = 2000
+# at most this many propositions outside the window are drawn in the overview of a windowed graph
+OVERVIEW_SIZE = 2000
+# columns of an empty DTA
+COLUMNS = ['Proposition', 'Speaker', 'Responds To', 'Relation Type', 'Distance', 'Line Type', 'Text']
+# edge traces by line type code, in legend order
+EDGE_STYLES = {
+    1: {'name': 'responds to', 'line': {'width': 1, 'color': '#888'}},
+    2: {'name': 'may respond to', 'line': {'dash': 'dot', 'width': 1, 'color': '#888'}},
+    0: {'name': 'no line', 'visible': True, 'line': {'width': 0.01, 'color': '#888'}},
+}
+# y coordinate conventions: 'count' puts the root at y == number of propositions and counts down, as VisualDTA does;
+# 'stream' puts the root at y == 0, so earlier coordinates stay put when propositions are appended
+Y_MODES = ['count', 'stream']
 # YES = [1, 'yes', 'y', 'Yes', 'YES', 'Y']
 # NO = [0, 'no', 'n', 'No', 'NO', 'N']
 
@@ -37,128 +64,663 @@ DOTTED_LINE = [2, 'SOLID', 'solid', 'solid line', 'SOLID LINE', 'SOLID_LINE', 's
 # # #
 
 
+def _line_type_code(value):
+    """
+    Codes a `Line Type` value as no-line (0), solid-line (1), or dotted-line (2), and -1 if unrecognized.
+    """
+    if value in NO_LINE:
+        return 0
+    elif value in SOLID_LINE:
+        return 1
+    elif value in DOTTED_LINE:
+        return 2
+    else:
+        return -1
+
+
+def _line_type_codes(line_type):
+    """
+    Codes a column of `Line Type` values, checking each distinct value only once.
+    """
+    uniques_id, uniques = pd.factorize(line_type)
+    codes = [_line_type_code(value) for value in uniques]
+    # missing values are factorized to -1, which picks the trailing -1
+    return np.array(codes + [-1], dtype=np.int8)[uniques_id]
+
+
+def relation_type_code(value):
+    """
+    Normalizes a `Relation Type` value the way `static.check_value_type` compares it, stripped and upper-cased, so
+    ' t' is drawn and counted as 'T'. Missing values are returned as they are.
+    """
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return value
+    return str(value).strip().upper()
+
+
+def relation_type_codes(relation_type):
+    """
+    Normalizes a column of `Relation Type` values, see `relation_type_code`, each distinct value only once.
+    :return: an object array, missing values as NaN
+    """
+    uniques_id, uniques = pd.factorize(relation_type)
+    codes = [relation_type_code(value) for value in uniques]
+    # missing values are factorized to -1, which picks the trailing NaN
+    return np.array(codes + [np.nan], dtype=object)[uniques_id]
+
+
+def _last_rows(proposition):
+    """
+    Maps each proposition onto the last row it appears in.
+    """
+    return dict(zip(proposition.tolist(), range(len(proposition))))
+
+
+def _parent_row(rows, responds_to):
+    """
+    Finds the row of the proposition `responds_to` names in `rows` (proposition -> row), -1 if there is none.
+    The value is matched as an integer first and as is otherwise, so 3.0 and "3" both find proposition 3.
+    """
+    try:
+        return rows[int(responds_to)]
+    except (KeyError, TypeError, ValueError):
+        return rows.get(responds_to, -1)
+
+
+# layout array -> the heading it comes from
+ARRAY_HEADINGS = {'node_id': 'Proposition',
+                  'propositions': 'Proposition',
+                  'last_row': 'Proposition',
+                  'parent_id': 'Responds To',
+                  'parent': 'Responds To',
+                  'distance': 'Distance',
+                  'line_type': 'Line Type'}
+
+
+def _required(arrays, *keys):
+    """
+    Picks `keys` from `layout_arrays`, raising a KeyError naming the missing heading, as indexing `df` would.
+    """
+    for key in keys:
+        if key not in arrays:
+            raise KeyError(ARRAY_HEADINGS[key])
+    return [arrays[key] for key in keys]
+
+
+def layout_arrays(df):
+    """
+    Computes, in one pass over each column, the arrays layout works from, so `process_nodes`, `process_edges`, and
+    `static.validate` share them. Arrays of missing headings are left out.
+    :return: a dict of
+        'node_id', 'propositions': `Proposition` factorized
+        'last_row': the last row of each node
+        'parent_id': the node `Responds To` names, by equality as edges are found, -1 if none
+        'parent': the row each row responds to, matched as an integer first as positions are found (see
+                  `_parent_row`), -1 if none
+        'distance': `Distance` as floats, NaN where missing or not a number
+        'line_type': `Line Type` codes
+    """
+    arrays = {}
+    if 'Proposition' in df:
+        node_id, propositions = pd.factorize(df.Proposition)
+        last_row = np.empty(len(propositions), dtype=np.int64)
+        last_row[node_id[node_id >= 0]] = np.flatnonzero(node_id >= 0)
+        arrays.update(node_id=node_id, propositions=propositions, last_row=last_row)
+        if 'Responds To' in df:
+            uniques_id, uniques = pd.factorize(df['Responds To'])
+            nodes = dict(zip(propositions.tolist(), range(len(propositions))))
+            # missing values are factorized to -1, which picks the trailing -1
+            parent_id = np.append(pd.Index(propositions).get_indexer(uniques), -1)[uniques_id]
+            parent_node = np.array([_parent_row(nodes, value) for value in uniques] + [-1], dtype=np.int64)[uniques_id]
+            arrays.update(parent_id=parent_id, parent=np.where(parent_node >= 0, last_row[parent_node], -1))
+    if 'Distance' in df:
+        arrays['distance'] = pd.to_numeric(df.Distance, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    if 'Line Type' in df:
+        arrays['line_type'] = _line_type_codes(df['Line Type'])
+    return arrays
+
+
+def _accumulate_along_parents(parent, distance):
+    """
+    Sums `distance` from each row up to the root, where parent[root] == -1 and every parent precedes its child.
+    Uses pointer jumping, so the number of array passes grows with the log of the deepest chain.
+    """
+    total = distance.copy()
+    jump = parent.copy()
+    active = jump >= 0
+    while active.any():
+        ancestor = jump[active]
+        total[active] += total[ancestor]
+        jump[active] = jump[ancestor]
+        active = jump >= 0
+    return total
+
+
+def _group_by_relation_type(relation_type, relation_types, root=True):
+    """
+    Buckets row indices by relation type in a single pass; the root goes to ROOT_RELATION_TYPE and rows of unknown
+    relation types are left out.
+    :param root: whether the first row is the root, rather than the first of a block appended later
+    """
+    codes = list(relation_types)
+    group = pd.Index(codes).get_indexer(relation_type_codes(relation_type))
+    if root and len(group) and ROOT_RELATION_TYPE in relation_types:
+        group[0] = codes.index(ROOT_RELATION_TYPE)
+    counts = np.bincount(group[group >= 0], minlength=len(codes))
+    # a stable sort keeps rows in their original order within each bucket
+    order = np.argsort(group, kind='stable')
+    buckets = {}
+    start = len(group) - counts.sum()
+    for code, count in zip(codes, counts):
+        buckets[code] = order[start:start + count]
+        start += count
+    return buckets
+
+
+def _segments_in_range(edge_x, edge_y, y_range):
+    """
+    Keeps the [start, end, NaN] segments that cross `y_range`.
+    """
+    x = edge_x.reshape(-1, 3)
+    y = edge_y.reshape(-1, 3)
+    keep = (np.minimum(y[:, 0], y[:, 1]) <= y_range[1]) & (np.maximum(y[:, 0], y[:, 1]) >= y_range[0])
+    return x[keep].ravel(), y[keep].ravel()
+
+
+# edge traces are drawn in this order of line type codes
+LINE_TYPE_ORDER = [1, 2, 0]
+
+
+def _edge_geometry(positions, parent, child, line_type):
+    """
+    Lays out edges as [start, end, NaN, ...] x and y arrays, the form plotly expects for disconnected lines, with one
+    scatter into arrays preallocated for every line type at once. Each edge is drawn from its earlier end, in the order
+    networkx would report them.
+    :return: {line type code: (x, y)}, read-only views of the shared arrays
+    """
+    first = np.minimum(parent, child)
+    second = np.maximum(parent, child)
+    # group edges by line type, in LINE_TYPE_ORDER
+    block = np.empty(len(LINE_TYPE_ORDER), dtype=np.int64)
+    block[LINE_TYPE_ORDER] = np.arange(len(LINE_TYPE_ORDER))
+    block = block[line_type]
+    order = np.lexsort((child, parent, first, block))
+    counts = np.bincount(block, minlength=len(LINE_TYPE_ORDER))
+    # (x or y, edge, [start, end, NaN])
+    xy = np.full((2, len(order), 3), np.nan)
+    xy[:, :, 0] = positions[first[order]].T
+    xy[:, :, 1] = positions[second[order]].T
+    # handed out to every thread drawing the graph, so nobody gets to change them
+    xy.flags.writeable = False
+    geometry = {}
+    start = 0
+    for code, count in zip(LINE_TYPE_ORDER, counts):
+        geometry[code] = (xy[0, start:start + count].ravel(), xy[1, start:start + count].ravel())
+        start += count
+    return geometry
+
+
+# plotly templates as dicts, keyed by name, see `_layout`
+_templates = {}
+
+
+def _layout(annotations=None):
+    """
+    The layout every DTA graph shares, as a dict. Y tick labels are only shown alongside annotations.
+    The default plotly template is included, as go.Figure would, so figures drawn from the dict look the same.
+    """
+    name = pio.templates.default
+    if name not in _templates:
+        _templates[name] = pio.templates[name].to_plotly_json()
+    layout = dict(template=_templates[name],
+                  title=dict(font=dict(size=20)),
+                  showlegend=True,
+                  hovermode='closest',
+                  width=1000,
+                  height=1000,
+                  margin=dict(b=20, l=5, r=5, t=40),
+                  xaxis=dict(showgrid=False, zeroline=False, showticklabels=True,
+                             tickformat=',d',
+                             scaleanchor='y',
+                             scaleratio=8),
+                  yaxis=dict(showgrid=False, zeroline=False, showticklabels=annotations is not None,
+                             type='linear',
+                             constrain='range',
+                             ticks='outside'))
+    if annotations is not None:
+        layout['annotations'] = annotations
+    return layout
+
+
+def _dta_rows(result, dta, *args, **kwargs):
+    """
+    Counts the rows a DTA method handled, for `timed`.
+    """
+    return len(dta.positions)
+
+
 class DTA(object):
     """
     DTA class is used to do the heavy lifting on https://visual-dta.herokuapp.com/.
     Generates a graph with read-in dataframe.
+    Once laid out, a DTA can be drawn from several threads at once: drawing only fills caches (edge coordinates, the
+    networkx graph, the columns drawn, text) with the same values whichever thread gets there first. Laying out and appending are not
+    thread-safe.
     """
 
-    def __init__(self, df):
-        # construct a dataframe to hold user input
-        self.df = df
-        # construct a graph
-        self.graph = nx.Graph()
-        # hold nodes' position
-        self.nodes = {}
-        # edges
-        # self.edges = []
-        # self.edges_dotted = []
-        self.edge_x = []
-        self.edge_y = []
-        self.edge_dotted_x = []
-        self.edge_dotted_y = []
-        self.edge_noline_x = []
-        self.edge_noline_y = []
+    def __init__(self, df=None, relation_types=RELATION_TYPES, y_mode='count', high_volume_threshold=HIGH_VOLUME_THRESHOLD,
+                 text=None):
+        # construct a dataframe to hold user input, an empty one to be filled by `append`
+        # a shallow copy, so columns added here never show up in the caller's frame, which may be shared between threads
+        self.df = pd.DataFrame(columns=COLUMNS) if df is None else df.copy(deep=False)
+        # called for the `Text` column when it is first drawn if `df` has none, e.g. a `static.read_text` partial
+        self.load_text = text
+        self._text = None
+        # relation types to draw, see RELATION_TYPES
+        self.relation_types = relation_types
+        # y coordinate convention, see Y_MODES
+        if y_mode not in Y_MODES:
+            raise ValueError(f'y_mode should be one of {Y_MODES}, got {y_mode!r}')
+        self.y_mode = y_mode
+        # proposition count above which `draw_graph` renders with WebGL
+        self.high_volume_threshold = high_volume_threshold
+        # construct a graph: positions, parents, and line types as arrays indexed by row
+        self.array_graph = ArrayGraph()
+        # the networkx equivalent, built when `graph` is first asked for
+        self._graph = None
+        # rows and nodes' position bucketed by relation type, {code: (rows, positions)} grown as propositions arrive
+        self._buckets = {code: (GrowableArray(np.empty(0, dtype=np.int64)), GrowableArray(np.empty((0, 2))))
+                         for code in self.relation_types}
+        # edges' coordinates by line type, laid out from the graph when first drawn, see `_edge_coordinates`
+        self._edge_geometry = None
         # semantic distance metrics
         self.accumulated_semantic_distance = None
         self.mean_semantic_distance = None
         self.mean_semantic_distance_only_for_P = None
+        # running sums behind the metrics, also broken down by relation type and speaker
+        self.metrics = SemanticDistanceMetrics()
 
-    def process_nodes(self):
-        # calculates x, y coordinates from data
-        node_x = []
-        node_y = []
-
-        for idx, row in self.df.iterrows():
+    @timed('process_nodes', rows=lambda result, dta, *args, **kwargs: len(dta.df))
+    def process_nodes(self, arrays=None):
+        """
+        Calculates x, y coordinates from data.
+        x accumulates `Distance` along the chain of `Responds To` back to the root, y counts down by one per
+        proposition, from the number of propositions or from zero depending on `y_mode`. Coordinates are kept row by
+        row in `self.positions`, an (n, 2) float array.
+        :param arrays: `layout_arrays` of `df`, if already computed
+        """
+        arrays = layout_arrays(self.df) if arrays is None else arrays
+        n = len(self.df)
+        parent, distance = _required(arrays, 'parent', 'distance')
+        parent, distance = parent.copy(), distance.copy()
+        # root, root should starts from x==0, suggested by SCH
+        parent[:1] = -1
+        distance[:1] = 0.0
+        # every proposition has to respond to one that comes before it
+        orphan = np.flatnonzero((parent >= np.arange(n)) | ((parent < 0) & (np.arange(n) > 0)))
+        if orphan.size:
+            raise KeyError(self.df['Responds To'].iloc[orphan[0]])
+
+        positions = np.empty((n, 2), dtype=float)
+        positions[:, 0] = _accumulate_along_parents(parent, distance)
+        top = float(self.df.Proposition.count()) if self.y_mode == 'count' else 0.0
+        positions[:, 1] = top - np.arange(n)
+        self.array_graph.reset(self.df.Proposition.tolist(), positions)
+        self._graph = None
+        self._edge_geometry = None
+        self._columns = {}
+        self._group_nodes()
+
+        self.metrics = SemanticDistanceMetrics()
+        self.metrics.extend(self.positions[:, 0], relation_type_codes(self.df['Relation Type']), self.df.get('Speaker'))
+        self._publish_metrics()
+
+    @timed('process_edges', rows=_dta_rows)
+    def process_edges(self, arrays=None):
+        """
+        Finds no-line(0), solid-line (1), and dotted-line (2) edges.
+        Parents are looked up through a Proposition index instead of comparing every pair of rows, so the cost is
+        linear in the number of propositions.
+        :param arrays: `layout_arrays` of `df`, if already computed
+        :return:
+        """
+        arrays = layout_arrays(self.df) if arrays is None else arrays
+        node_id, last_row, parent_id, distance, line_type = _required(arrays, 'node_id', 'last_row', 'parent_id',
+                                                                      'distance', 'line_type')
+        # breaks (distance 4) are never connected to the proposition they respond to
+        keep = (parent_id >= 0) & (node_id >= 0) & (line_type >= 0) & (distance != 4)
+        # a proposition stands where it last appears
+        child = np.flatnonzero(keep)
+        parent = last_row[parent_id[keep]]
+        line_type = line_type[keep]
+        self.array_graph.set_edges(child, parent, line_type)
+        self._graph = None
+        self._edge_geometry = None
+
+    def append(self, row):
+        """
+        Adds one proposition to a processed (or empty) DTA without relaying out earlier ones.
+        Positions, the graph, edge coordinates, relation type buckets, the columns drawn (`Speaker`, `Text`), and the
+        semantic distance metrics are updated in O(1) amortized time; the row is buffered by column and only merged
+        into `df` when `df` is asked for.
+        Needs y_mode='stream', since in 'count' mode every y coordinate moves when a proposition arrives.
+        :param row: a mapping with the seven headings, e.g. a dict or a pandas Series
+        :return:
+        """
+        if self.y_mode != 'stream':
+            raise ValueError("Appending propositions needs y_mode='stream'.")
+        row = dict(row)
+        idx = len(self.positions)
+        if idx == 0:
             # root, root should starts from x==0, suggested by SCH
-            if idx == 0:
-                cur_x = 0.0
-                cur_y = float(self.df.Proposition.count())
-            # tree
-            else:
-                # deal with the P, T, B, and X situation
-                # cur_x' calculation is subjective to position (whether is the first point) and
-                # 'Responds To' value
-                # TODO: ROBUST ('Responds To')
-#                 if not row['Responds To'] in UNKNOWN:
-                try:
-                    # in case of string proposition
-                    cur_x = self.nodes[int(row['Responds To'])][0] + float(row.Distance)
-                except:
-                    # for propositions coded with pure number
-                    cur_x = self.nodes[row['Responds To']][0] + float(row.Distance)
-#                 else:
-#                     # deal with the [B]reak situation
-#                     # conveniently set the current point four units to the root
-# #                     cur_x = self.nodes[0][0] + 4
-# #                     cur_x += 4
-#                     pass
-                cur_y = float(self.df.Proposition.count() - idx)
-
-            node_x.append(cur_x)
-            node_y.append(cur_y)
-            self.nodes.update({row.Proposition: [cur_x, cur_y]})
-
-        for node in self.df.Proposition:
-            self.graph.add_node(node, pos=(self.nodes[node]))
-
-        # for (node, xy) in zip(self.nodes.keys(), list(zip(node_x, node_y))):
-        #     graph.add_node(node, pos=(xy[0], xy[1]))
-
-        # use df to trace positions
-        self.df['Pos'] = pd.Series(list(self.nodes.values()))
-        self.accumulated_semantic_distance = max([x for node, (x, y) in self.nodes.items()])
-        self.mean_semantic_distance = round(np.mean([x for node, (x, y) in self.nodes.items()]), 3)
-        self.mean_semantic_distance_only_for_P = round(np.mean([[x for node, (x, y) in self.nodes.items()][idx] for idx in list(self.df[self.df['Relation Type'] == 'P'].index)]), 3)
-
-    def process_edges(self):
-        """
-        Finds no-line(0), dotted-line (1), and solid-line (2) edges
+            parent = -1
+            x = 0.0
+        else:
+            parent = _parent_row(self.array_graph.index, row['Responds To'])
+            if parent < 0:
+                raise KeyError(row['Responds To'])
+            x = float(self.positions[parent, 0]) + float(row['Distance'])
+        y = -float(idx)
+
+        # edge to the proposition responded to, found by equality as in `process_edges`
+        responded = self.array_graph.index.get(row['Responds To'], -1) if idx else -1
+        line_type = _line_type_code(row['Line Type'])
+        if responded < 0 or line_type < 0 or row['Distance'] == 4:
+            responded = line_type = -1
+        self.array_graph.append(row['Proposition'], x, y, responded, line_type)
+        self._graph = None
+        if responded >= 0:
+            self._add_edges(np.array([responded]), np.array([idx]), np.array([line_type]))
+        code = relation_type_code(row['Relation Type'])
+        bucket = ROOT_RELATION_TYPE if idx == 0 else code
+        if bucket in self._buckets:
+            rows, xy = self._buckets[bucket]
+            rows.extend([idx])
+            xy.extend([(x, y)])
+        self._buffer_row(row)
+
+        self.metrics.update(x, code, row.get('Speaker'))
+        self._publish_metrics()
+
+    def extend(self, rows):
+        """
+        Appends propositions, see `append`. A DataFrame, e.g. a chunk from `static.read_transcript_chunks`, is laid out
+        in one vectorized pass; other iterables one row at a time.
+        :param rows: a DataFrame or an iterable of mappings
         :return:
         """
-        for idx1, row1 in self.df.iterrows():
-            for idx2, row2 in self.df.iterrows():
-                if row1.Proposition == row2['Responds To'] and row2['Line Type'] in NO_LINE and row2.Distance != 4:
-                    # self.edges.append([row1.Proposition, row2.Proposition])
-                    self.graph.add_edge(row1.Proposition, row2.Proposition, line_type='no_line')
-                #                 edges.append((row1.Proposition, row2.Proposition))
-                elif row1.Proposition == row2['Responds To'] and row2['Line Type'] in SOLID_LINE and row2.Distance != 4:
-                    # self.edges_dotted.append([row1.Proposition, row2.Proposition])
-                    self.graph.add_edge(row1.Proposition, row2.Proposition, line_type='solid_line')
-                #                 edges_dotted.append((row1.Proposition, row2.Proposition))
-                elif row1.Proposition == row2['Responds To'] and row2['Line Type'] in DOTTED_LINE and row2.Distance != 4:
-                    # self.edges_dotted.append([row1.Proposition, row2.Proposition])
-                    self.graph.add_edge(row1.Proposition, row2.Proposition, line_type='dotted_line')
-                #                 edges_dotted.append((row1.Proposition, row2.Proposition))
-                else:
-                    # TODO: ROBUST
-                    # should raise some error to guide users
-                    pass
-
-        for edgeTuple in list(self.graph.edges.data()):
-            x0, y0 = self.graph.nodes[edgeTuple[:2][0]]['pos']
-            x1, y1 = self.graph.nodes[edgeTuple[:2][1]]['pos']
-            if edgeTuple[2]['line_type'] == 'solid_line':
-                self.edge_x.append(x0)
-                self.edge_x.append(x1)
-                self.edge_x.append(None)
-                self.edge_y.append(y0)
-                self.edge_y.append(y1)
-                self.edge_y.append(None)
-            elif edgeTuple[2]['line_type'] == 'dotted_line':
-                self.edge_dotted_x.append(x0)
-                self.edge_dotted_x.append(x1)
-                self.edge_dotted_x.append(None)
-                self.edge_dotted_y.append(y0)
-                self.edge_dotted_y.append(y1)
-                self.edge_dotted_y.append(None)
-            else:
-                self.edge_noline_x.append(x0)
-                self.edge_noline_x.append(x1)
-                self.edge_noline_x.append(None)
-                self.edge_noline_y.append(y0)
-                self.edge_noline_y.append(y1)
-                self.edge_noline_y.append(None)
+        if isinstance(rows, pd.DataFrame):
+            self._extend_frame(rows)
+            return
+        for row in rows:
+            self.append(row)
+
+    def _extend_frame(self, frame):
+        """
+        Appends a block of propositions, laid out as `append` would one by one. Parents may be in the block or before
+        it.
+        """
+        if self.y_mode != 'stream':
+            raise ValueError("Appending propositions needs y_mode='stream'.")
+        n = len(frame)
+        if n == 0:
+            return
+        frame = frame.reset_index(drop=True)
+        offset = len(self.positions)
+        labels = frame.Proposition.tolist()
+        local = _last_rows(frame.Proposition)
+        index = self.array_graph.index
+
+        uniques_id, uniques = pd.factorize(frame['Responds To'])
+        parent_lookup, responded_lookup = [], []
+        for value in uniques:
+            row = _parent_row(local, value)
+            parent_lookup.append(offset + row if row >= 0 else _parent_row(index, value))
+            # found by equality as in `process_edges`
+            row = local.get(value, -1)
+            responded_lookup.append(offset + row if row >= 0 else index.get(value, -1))
+        # missing values are factorized to -1, which picks the trailing -1
+        parent = np.array(parent_lookup + [-1], dtype=np.int64)[uniques_id]
+        responded = np.array(responded_lookup + [-1], dtype=np.int64)[uniques_id]
+        distance = pd.to_numeric(frame.Distance).to_numpy(dtype=float, na_value=np.nan, copy=True)
+        if offset == 0:
+            # root, root should starts from x==0, suggested by SCH
+            parent[0] = responded[0] = -1
+            distance[0] = 0.0
+        # every proposition has to respond to one that comes before it
+        rows = offset + np.arange(n)
+        orphan = np.flatnonzero((parent >= rows) | ((parent < 0) & (rows > 0)))
+        if orphan.size:
+            raise KeyError(frame['Responds To'].iloc[orphan[0]])
+
+        # start from the x of parents laid out earlier, then accumulate along parents within the block
+        x = distance.copy()
+        earlier = (parent >= 0) & (parent < offset)
+        x[earlier] += self.positions[parent[earlier], 0]
+        x = _accumulate_along_parents(np.where(parent >= offset, parent - offset, -1), x)
+        positions = np.column_stack((x, -rows.astype(float)))
+
+        line_type = _line_type_codes(frame['Line Type'])
+        keep = (responded >= 0) & (responded < rows) & (line_type >= 0) & (distance != 4)
+        responded = np.where(keep, responded, -1)
+        line_type = np.where(keep, line_type, -1)
+        self.array_graph.extend(labels, positions, responded, line_type)
+        self._graph = None
+        self._add_edges(responded[keep], rows[keep], line_type[keep])
+        for code, block in _group_by_relation_type(frame['Relation Type'], self.relation_types,
+                                                   root=offset == 0).items():
+            bucket_rows, xy = self._buckets[code]
+            bucket_rows.extend(offset + block)
+            xy.extend(positions[block])
+        self._buffer_frame(frame)
+
+        self.metrics.extend(x, relation_type_codes(frame['Relation Type']), frame.get('Speaker'))
+        self._publish_metrics()
+
+    @property
+    def positions(self):
+        """
+        Nodes' position, a read-only (n, 2) float array with one (x, y) row per proposition. Trace builders and
+        annotations read coordinates from here; `df` is never given a column of them.
+        """
+        positions = self.array_graph.positions.view()
+        positions.flags.writeable = False
+        return positions
+
+    @property
+    def graph(self):
+        """
+        The networkx graph of propositions, with `pos` node and `line_type` edge attributes, built on first access.
+        """
+        if self._graph is None:
+            self._graph = self.array_graph.to_networkx()
+        return self._graph
+
+    @property
+    def df(self):
+        """
+        The propositions as a DataFrame, appended ones included.
+        """
+        self._flush()
+        return self._df
+
+    @df.setter
+    def df(self, df):
+        self._df = df
+        # appended rows not yet merged into `df`: frames from `extend`, and the current run of `append`ed rows by column
+        self._pending = []
+        self._pending_rows = {}
+        self._pending_count = 0
+        # columns drawn, see `_column`
+        self._columns = {}
+        self._text = None
+
+    @property
+    def text(self):
+        """
+        The `Text` column as an object array, loaded through `load_text` if `df` has none, and blank if there is no
+        loader either.
+        """
+        text = self._column('Text')
+        if text is not None:
+            return text
+        if self._text is None or len(self._text) != len(self.positions):
+            text = [''] * len(self.positions) if self.load_text is None else list(self.load_text())
+            self._text = np.array(text, dtype=object)
+        return self._text
+
+    @property
+    def speaker(self):
+        """
+        The `Speaker` column as an object array, blank if `df` has none.
+        """
+        speaker = self._column('Speaker')
+        return np.full(len(self.positions), '', dtype=object) if speaker is None else speaker
+
+    def _column(self, column):
+        """
+        One column of `df` as a read-only object array, None if `df` has no such column. Taken from `df` once, then
+        grown as propositions are appended, so drawing never merges appended rows into `df`.
+        """
+        if column not in self._columns:
+            df = self.df
+            self._columns[column] = GrowableArray(df[column].to_numpy(dtype=object)) if column in df else None
+        values = self._columns[column]
+        return None if values is None else values.values
+
+    def _buffer_row(self, row):
+        """
+        Keeps an appended row for `df`, column by column, and adds it to the columns drawn.
+        """
+        n = self._pending_count
+        for column, value in row.items():
+            values = self._pending_rows.get(column)
+            if values is None:
+                values = self._pending_rows[column] = [np.nan] * n
+            values.append(value)
+        for values in self._pending_rows.values():
+            if len(values) == n:
+                values.append(np.nan)
+        self._pending_count = n + 1
+        for column, values in self._columns.items():
+            if values is not None:
+                values.extend([row.get(column, np.nan)])
+
+    def _buffer_frame(self, frame):
+        """
+        Keeps an appended block for `df`, and adds it to the columns drawn.
+        """
+        self._close_rows()
+        self._pending.append(frame)
+        for column, values in self._columns.items():
+            if values is not None:
+                values.extend(frame[column].to_numpy(dtype=object) if column in frame else
+                              np.full(len(frame), np.nan, dtype=object))
+
+    def _close_rows(self):
+        """
+        Turns the current run of appended rows into a frame.
+        """
+        if self._pending_count:
+            self._pending.append(pd.DataFrame(self._pending_rows))
+            self._pending_rows = {}
+            self._pending_count = 0
+
+    @property
+    def node_group_rows(self):
+        """
+        The rows of each relation type, {code: read-only int array}.
+        """
+        return {code: rows.values for code, (rows, xy) in self._buckets.items()}
+
+    @property
+    def node_groups(self):
+        """
+        The positions of each relation type, {code: read-only (n, 2) float array}.
+        """
+        return {code: xy.values for code, (rows, xy) in self._buckets.items()}
+
+    def _group_nodes(self):
+        """
+        Buckets every row and its position by relation type.
+        """
+        rows = _group_by_relation_type(self.df['Relation Type'], self.relation_types)
+        self._buckets = {code: (GrowableArray(block), GrowableArray(self.positions[block]))
+                         for code, block in rows.items()}
+
+    def _edge_coordinates(self):
+        """
+        Maps each line type code onto its edges' x and y coordinates, read-only NaN-separated float arrays.
+        They are laid out from the whole graph the first time they are asked for after `process_nodes` or
+        `process_edges`, and then grown in place by `append` and `extend`.
+        """
+        if self._edge_geometry is None:
+            parent, child, line_type = self.array_graph.edges()
+            self._edge_geometry = {code: (GrowableArray(x.reshape(-1, 3)), GrowableArray(y.reshape(-1, 3)))
+                                   for code, (x, y) in _edge_geometry(self.positions, parent, child, line_type).items()}
+        return {code: (x.values.ravel(), y.values.ravel()) for code, (x, y) in self._edge_geometry.items()}
+
+    def _add_edges(self, parent, child, line_type):
+        """
+        Adds the [start, end, NaN] segments of appended edges to the edge coordinates, if they were laid out already;
+        otherwise they are laid out with everything else when first drawn. Parents come before their children.
+        """
+        if self._edge_geometry is None or not len(child):
+            return
+        # in the order `_edge_geometry` would put them within the block
+        order = np.lexsort((child, parent))
+        parent, child, line_type = parent[order], child[order], line_type[order]
+        positions = self.positions
+        for code, (x, y) in self._edge_geometry.items():
+            mine = line_type == code
+            if mine.any():
+                start, end = positions[parent[mine]], positions[child[mine]]
+                x.extend(np.column_stack((start[:, 0], end[:, 0], np.full(len(start), np.nan))))
+                y.extend(np.column_stack((start[:, 1], end[:, 1], np.full(len(start), np.nan))))
+
+    @property
+    def edge_x(self):
+        return self._edge_coordinates()[1][0]
+
+    @property
+    def edge_y(self):
+        return self._edge_coordinates()[1][1]
+
+    @property
+    def edge_dotted_x(self):
+        return self._edge_coordinates()[2][0]
+
+    @property
+    def edge_dotted_y(self):
+        return self._edge_coordinates()[2][1]
+
+    @property
+    def edge_noline_x(self):
+        return self._edge_coordinates()[0][0]
+
+    @property
+    def edge_noline_y(self):
+        return self._edge_coordinates()[0][1]
+
+    def _publish_metrics(self):
+        """
+        Copies the metrics shown under a graph onto their attributes.
+        """
+        self.accumulated_semantic_distance = self.metrics.accumulated
+        self.mean_semantic_distance = self.metrics.mean
+        self.mean_semantic_distance_only_for_P = self.metrics.mean_only_for_P
+
+    def _flush(self):
+        """
+        Merges appended propositions into `df`. Only asking for `df` does this; drawing does not need it.
+        """
+        self._close_rows()
+        if not self._pending:
+            return
+        # an empty `df` is left out, so it does not turn the compact dtypes of extended blocks into object
+        frames = ([self._df] if len(self._df) else []) + self._pending
+        self._df = pd.concat(frames, ignore_index=True)
+        self._pending = []
 
     # def node_trace_first_proposition(self):
     #     """
@@ -180,174 +742,179 @@ class DTA(object):
     #             line_width=2))
     #     return node_trace_first_proposition
 
-    def node_trace_pr(self):
+    def _node_trace(self, relation_type, hover_text=None, y_range=None):
         """
-
-        :return:
+        The properties of one relation type's marker trace, from the buckets filled by `process_nodes`.
         """
-        x = [self.df.iloc[0:1].Pos[0][0]] + [x for [x, y] in self.df[self.df['Relation Type'] == 'PR'].Pos]
-        y = [self.df.iloc[0:1].Pos[0][1]] + [y for [x, y] in self.df[self.df['Relation Type'] == 'PR'].Pos]
-        node_trace_pr = go.Scatter(
-            # first entry
-            x=x,
-            y=y,
-            name='prompt',
+        style = self.relation_types[relation_type]
+        xy = self.node_groups[relation_type]
+        rows = self.node_group_rows[relation_type]
+        if y_range is not None:
+            inside = (xy[:, 1] >= y_range[0]) & (xy[:, 1] <= y_range[1])
+            xy, rows = xy[inside], rows[inside]
+        node_trace = dict(
+            x=xy[:, 0],
+            y=xy[:, 1],
+            name=style['name'],
             mode='markers',
             hoverinfo='text',
-            marker_symbol='square',
             marker=dict(
                 showscale=False,
-                color='yellow',
                 size=8,
-                line_width=2))
-        return node_trace_pr
+                line=dict(width=2),
+                **style['marker']))
+        if hover_text is not None:
+            node_trace['text'] = hover_text[rows]
+        return node_trace
+
+    @timed('node_traces', rows=_dta_rows)
+    def _node_traces(self, trace_type, hover_text=None, y_range=None):
+        """
+        The properties of every marker trace, in the order of `self.relation_types`.
+        :param trace_type: 'scatter', or 'scattergl' for large graphs
+        """
+        return [dict(self._node_trace(relation_type, hover_text, y_range), type=trace_type)
+                for relation_type in self.relation_types]
 
-    def node_trace_t(self):
+    def node_trace(self, relation_type, trace=go.Scatter, hover_text=None, y_range=None):
+        """
+        Builds the marker trace of one relation type from the buckets filled by `process_nodes`.
+        :param relation_type: a key of `self.relation_types`, e.g. 'T'
+        :param trace: go.Scatter, or go.Scattergl for large graphs
+        :param hover_text: an array of one label per row, optional
+        :param y_range: (low, high), only draw propositions in between, optional
+        :return:
         """
+        return trace(self._node_trace(relation_type, hover_text, y_range))
 
+    def node_traces(self, trace=go.Scatter, hover_text=None, y_range=None):
+        """
+        Builds one marker trace per relation type, in the order of `self.relation_types`.
         :return:
         """
-        x = [self.df.iloc[0:1].Pos[0][0]] + [x for [x, y] in self.df[self.df['Relation Type'] == 'T'].Pos]
-        y = [self.df.iloc[0:1].Pos[0][1]] + [y for [x, y] in self.df[self.df['Relation Type'] == 'T'].Pos]
-        x = x[1:]
-        y = y[1:]
-        node_trace_t = go.Scatter(
-            # all T
-            x=x,
-            y=y,
-            name='Narrowly on-topic (T)',
-            mode='markers',
-            hoverinfo='text',
-            marker=dict(
-                showscale=False,
-                color='blue',
-                size=8,
-                line_width=2))
-        return node_trace_t
+        return [self.node_trace(relation_type, trace, hover_text, y_range) for relation_type in self.relation_types]
 
-    def node_trace_p(self):
+    def node_trace_pr(self):
+        """
+        The root and all PR.
+        :return:
         """
+        return self.node_trace('PR')
 
+    def node_trace_t(self):
+        """
+        All T.
         :return:
         """
-        x = [self.df.iloc[0:1].Pos[0][0]] + [x for [x, y] in self.df[self.df['Relation Type'] == 'P'].Pos]
-        y = [self.df.iloc[0:1].Pos[0][1]] + [y for [x, y] in self.df[self.df['Relation Type'] == 'P'].Pos]
-        x = x[1:]
-        y = y[1:]
-        node_trace_p = go.Scatter(
-            # all P
-            x=x,
-            y=y,
-            name='Parallel Shift (P)',
-            mode='markers',
-            hoverinfo='text',
-            marker=dict(
-                showscale=False,
-                color='red',
-                size=8,
-                line_width=2))
-        return node_trace_p
+        return self.node_trace('T')
 
-    def node_trace_b(self):
+    def node_trace_p(self):
+        """
+        All P.
+        :return:
         """
+        return self.node_trace('P')
 
+    def node_trace_b(self):
+        """
+        All B.
         :return:
         """
-        x = [self.df.iloc[0:1].Pos[0][0]] + [x for [x, y] in self.df[self.df['Relation Type'] == 'B'].Pos]
-        y = [self.df.iloc[0:1].Pos[0][1]] + [y for [x, y] in self.df[self.df['Relation Type'] == 'B'].Pos]
-        x = x[1:]
-        y = y[1:]
-        node_trace_b = go.Scatter(
-            # all B
-            x=x,
-            y=y,
-            name='Break (B)',
-            mode='markers',
-            hoverinfo='text',
-            marker=dict(
-                showscale=False,
-                color='green',
-                size=8,
-                line_width=2))
-        return node_trace_b
+        return self.node_trace('B')
 
     def node_trace_x(self):
         """
-
+        All X.
         :return:
         """
-        x = [self.df.iloc[0:1].Pos[0][0]] + [x for [x, y] in self.df[self.df['Relation Type'] == 'X'].Pos]
-        y = [self.df.iloc[0:1].Pos[0][1]] + [y for [x, y] in self.df[self.df['Relation Type'] == 'X'].Pos]
-        x = x[1:]
-        y = y[1:]
-        node_trace_x = go.Scatter(
-            # all X
-            x=x,
-            y=y,
-            name='Flexible (X)',
-            mode='markers',
-            hoverinfo='text',
-            marker=dict(
-                showscale=False,
-                color='purple',
-                size=8,
-                line_width=2))
-        return node_trace_x
+        return self.node_trace('X')
 
-    def edge_trace(self):
+    def _edge_trace(self, line_type, y_range=None):
+        """
+        The properties of the trace of one line type's edges, see EDGE_STYLES.
         """
+        x, y = self._edge_coordinates()[line_type]
+        if y_range is not None:
+            x, y = _segments_in_range(x, y, y_range)
+        return dict(x=x, y=y, hoverinfo='none', mode='lines', **EDGE_STYLES[line_type])
 
+    @timed('edge_traces')
+    def _edge_traces(self, trace_type, line_types=LINE_TYPE_ORDER, y_range=None):
+        """
+        The properties of the edge traces of `line_types`.
+        :param trace_type: 'scatter', or 'scattergl' for large graphs
+        """
+        return [dict(self._edge_trace(line_type, y_range), type=trace_type) for line_type in line_types]
+
+    def edge_trace(self, trace=go.Scatter, y_range=None):
+        """
+        :param trace: go.Scatter, or go.Scattergl for large graphs
+        :param y_range: (low, high), only draw edges crossing it, optional
         :return:
         """
-        edge_trace = go.Scatter(
-            x=self.edge_x,
-            y=self.edge_y,
-            name="responds to",
-            line=dict(width=1, color='#888'),
-            hoverinfo='none',
-            mode='lines')
-        return edge_trace
+        return trace(self._edge_trace(1, y_range))
 
-    def edge_dotted_trace(self):
+    def edge_dotted_trace(self, trace=go.Scatter, y_range=None):
+        """
+        :param trace: go.Scatter, or go.Scattergl for large graphs
+        :param y_range: (low, high), only draw edges crossing it, optional
+        :return:
         """
+        return trace(self._edge_trace(2, y_range))
 
+    def edge_noline_trace(self, trace=go.Scatter, y_range=None):
+        """
+        :param trace: go.Scatter, or go.Scattergl for large graphs
+        :param y_range: (low, high), only draw edges crossing it, optional
         :return:
         """
-        edge_dotted_trace = go.Scatter(
-            x=self.edge_dotted_x,
-            y=self.edge_dotted_y,
-            name="may respond to",
-            line=dict(dash='dot', width=1, color='#888'),
-            hoverinfo='none',
-            mode='lines')
-        return edge_dotted_trace
+        return trace(self._edge_trace(0, y_range))
 
-    def edge_noline_trace(self):
+    def _overview_trace(self, rows, size=OVERVIEW_SIZE):
         """
+        The properties of the overview trace, see `overview_trace`.
+        """
+        rows = rows[::max(1, -(-len(rows) // size))] if size else rows[:0]
+        return dict(
+            x=self.positions[rows, 0],
+            y=self.positions[rows, 1],
+            name='overview',
+            mode='markers',
+            hoverinfo='none',
+            marker=dict(
+                color='#ccc',
+                size=3))
 
+    def overview_trace(self, rows, size=OVERVIEW_SIZE):
+        """
+        Draws every k-th of `rows` as faint markers, at most `size` of them, to sketch the parts of a long
+        conversation outside the window.
         :return:
         """
-        edge_noline_trace = go.Scatter(
-            x=self.edge_noline_x,
-            y=self.edge_noline_y,
-            name="no line",
-            visible=True,
-            line=dict(width=0.01, color='#888'),
-            hoverinfo='none',
-            mode='lines')
-        return edge_noline_trace
+        return go.Scattergl(self._overview_trace(rows, size))
 
-    def annotations(self):
+    @timed('annotations', rows=lambda result, *args, **kwargs: len(result))
+    def annotations(self, rows=None):
+        """
+        :param rows: annotate only these rows, optional
+        :return:
+        """
+        text = self.text
+        rows = np.arange(len(self.positions)) if rows is None else np.asarray(rows, dtype=np.intp)
+        # plain floats and values picked by row, rather than a row Series built per annotation
+        positions = self.positions[rows].tolist()
+        speakers = self.speaker[rows].tolist()
+        texts = text[rows].tolist()
         annotations = [dict(
-            x=self.df.iloc[i].Pos[0],
-            y=self.df.iloc[i].Pos[1],
-            hovertext=self.df.iloc[i].Speaker,
+            x=x,
+            y=y,
+            hovertext=speaker,
             xanchor='left',
             yanchor='bottom',
-            text=self.df.iloc[i].Text,
+            text=t,
             visible=True,
             showarrow=False)
-            for i in range(self.df.shape[0])]
+            for (x, y), speaker, t in zip(positions, speakers, texts)]
 
         return annotations
     #
@@ -365,71 +932,73 @@ class DTA(object):
     #
     #     return annotations
 
-    def draw_graph(self, annotations_switch):
+    @timed('hover_text', rows=lambda result, *args, **kwargs: len(result))
+    def hover_text(self):
+        """
+        Labels each row as "Speaker: Text", for hover labels.
+        """
+        return (pd.Series(self.speaker).astype(str) + ': ' + pd.Series(self.text).astype(str)).to_numpy()
+
+    @timed('figure_dict', rows=_dta_rows)
+    def figure_dict(self, annotations_switch, high_volume=None):
+        """
+        Builds the figure `draw_graph` draws as a plain dict, straight from the coordinate arrays and without plotly's
+        validation, ready for `payload.encode_figure`. Arrays and lists are shared with the DTA, so encode the dict
+        before adding propositions.
+        param:
+            annotations_switch: a boolean, control if the text is shown
+            high_volume: a boolean, see `draw_graph`
+        """
+        if high_volume is None:
+            high_volume = len(self.positions) > self.high_volume_threshold
+        if high_volume:
+            # no-line edges are invisible anyway, leave them out
+            data = (self._node_traces('scattergl', self.hover_text() if annotations_switch else None) +
+                    self._edge_traces('scattergl', (1, 2)))
+            annotations = None
+        else:
+            data = self._node_traces('scatter') + self._edge_traces('scatter')
+            annotations = self.annotations() if annotations_switch else None
+        return dict(data=data, layout=_layout(annotations))
+
+    @timed('window_dict', rows=_dta_rows)
+    def window_dict(self, y_range, annotations_switch, overview_size=OVERVIEW_SIZE):
+        """
+        Builds the figure `draw_window` draws as a plain dict, see `figure_dict`.
+        """
+        y_range = (min(y_range), max(y_range))
+        y = self.positions[:, 1]
+        inside = (y >= y_range[0]) & (y <= y_range[1])
+        high_volume = np.count_nonzero(inside) > self.high_volume_threshold
+        trace_type = 'scattergl' if high_volume else 'scatter'
+        hover_text = self.hover_text() if annotations_switch and high_volume else None
+        annotations = self.annotations(np.flatnonzero(inside)) if annotations_switch and not high_volume else None
+        data = ([dict(self._overview_trace(np.flatnonzero(~inside), overview_size), type='scattergl')] +
+                self._node_traces(trace_type, hover_text, y_range) +
+                self._edge_traces(trace_type, (1, 2), y_range))
+        layout = _layout(annotations)
+        layout['yaxis']['range'] = list(y_range)
+        return dict(data=data, layout=layout)
+
+    @timed('draw_graph', rows=_dta_rows)
+    def draw_graph(self, annotations_switch, high_volume=None):
         """
         param:
             annotations_switch: a boolean, a plotly dash radio-item value, control if the text is annotated on the graph
+            high_volume: a boolean, draw with WebGL (go.Scattergl) and show text on hover instead of as annotations;
+                decided by `high_volume_threshold` if None
         """
-        if annotations_switch:
-            fig = go.Figure()
-            fig.add_trace(self.node_trace_t())
-            fig.add_trace(self.node_trace_p())
-            fig.add_trace(self.node_trace_b())
-            fig.add_trace(self.node_trace_x())
-            fig.add_trace(self.node_trace_pr())
-            fig.add_trace(self.edge_trace())
-            fig.add_trace(self.edge_dotted_trace())
-            fig.add_trace(self.edge_noline_trace())
-
-            fig.update_layout(go.Layout(
-                titlefont_size=20,
-                showlegend=True,
-                hovermode='closest',
-                # hoverlabel={'Proposition': [p for p in self.df.Proposition],
-                #             'Speaker': [s for s in self.df.Speaker],
-                #             'Text': [t for t in self.df.Text]},
-                width=1000,
-                height=1000,
-                margin=dict(b=20, l=5, r=5, t=40),
-                annotations=self.annotations(),
-                xaxis=dict(showgrid=False, zeroline=False, showticklabels=True),
-                yaxis=dict(showgrid=False, zeroline=False, showticklabels=True)))
-
-            fig.update_yaxes(type='linear',
-                             # tickmode='auto',
-                             # title={'text': [str(p) for p in self.df.Proposition]},
-                             # ticktext=[y for y in self.edge_y].reverse(),
-                             # autorange="reversed",
-                             constrain='range',
-                             ticks='outside')
-            fig.update_xaxes(tickformat=',d',
-                             scaleanchor="y",
-                             scaleratio=8
-                             )
+        return go.Figure(self.figure_dict(annotations_switch, high_volume))
 
-        else:
-            fig = go.Figure(data=[self.node_trace_pr(), self.node_trace_t(), self.node_trace_p(), self.node_trace_b(), self.node_trace_x(),
-                                  self.edge_trace(), self.edge_dotted_trace(), self.edge_noline_trace()],
-                            layout=go.Layout(
-                                titlefont_size=20,
-                                showlegend=True,
-                                hovermode='closest',
-                                width=1000,
-                                height=1000,
-                                margin=dict(b=20, l=5, r=5, t=40),
-                                # annotations=self.annotations(),
-                                xaxis=dict(showgrid=False, zeroline=False, showticklabels=True),
-                                yaxis=dict(showgrid=False, zeroline=False, showticklabels=False))
-                            )
-            fig.update_yaxes(type='linear',
-                             # tickmode='auto',
-                             # title={'text': [str(p) for p in self.df.Proposition]},
-                             ticktext=[y for y in self.edge_y].reverse(),
-                             # autorange="reversed",
-                             constrain='range',
-                             ticks='outside')
-            fig.update_xaxes(tickformat=',d',
-                             scaleanchor="y",
-                             scaleratio=8
-                             )
-        return fig
+    @timed('draw_window', rows=_dta_rows)
+    def draw_window(self, y_range, annotations_switch, overview_size=OVERVIEW_SIZE):
+        """
+        Draws only the propositions with y inside `y_range` and the edges crossing it, plus a decimated overview of
+        the rest, so a long conversation can be browsed a slice at a time. Text is annotated when the slice is
+        small and shown on hover otherwise, see `high_volume_threshold`.
+        param:
+            y_range: (low, high) in y coordinates
+            annotations_switch: a boolean, control if the text is shown
+            overview_size: an int, how many propositions outside the window to sketch at most
+        """
+        return go.Figure(self.window_dict(y_range, annotations_switch, overview_size))
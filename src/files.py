@@ -0,0 +1,48 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+This module holds helpers for the files the app keeps on disk: parsed uploads, upload jobs' state, and cached
+workbooks, which several worker processes may read and write at once.
+"""
+
+
+import os
+import stat
+import tempfile
+import contextlib
+
+
+def private_directory(directory):
+    """
+    Creates `directory` for this user alone, or checks that an existing one is private: pickles are only ever read from
+    directories no other local user could have put files in.
+    :return: `directory`; a PermissionError is raised if it is not a directory (a symlink, say), belongs to another
+             user, or is open to the group or others
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode):
+        raise PermissionError(f'{directory} is not a directory.')
+    # no owners or permission bits to check on Windows
+    if hasattr(os, 'getuid') and (info.st_uid != os.getuid() or info.st_mode & 0o077):
+        raise PermissionError(f'{directory} should belong to this user and be closed to everyone else (mode 700).')
+    return directory
+
+
+@contextlib.contextmanager
+def atomic_path(path):
+    """
+    Yields a temporary path next to `path` to write to, then renames it over `path`, so a concurrent reader never sees
+    half a file. The temporary file is removed if writing fails.
+        with atomic_path(path) as tmp_path:
+            df.to_pickle(tmp_path)
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
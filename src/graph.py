@@ -0,0 +1,159 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+This module holds the array-backed graph DTA lays out propositions on.
+"""
+
+
+import numpy as np
+
+# edge attribute values of the networkx graph, indexed by line type code
+LINE_TYPE_NAMES = ['no_line', 'solid_line', 'dotted_line']
+
+
+class ArrayGraph(object):
+    """
+    A topic-flow graph stored as arrays indexed by row: proposition labels, (x, y) positions, the row each proposition
+    is drawn from (-1 if none), and the line type code of that edge (-1 if none).
+    Appending grows the arrays geometrically, so it takes O(1) amortized time.
+    """
+
+    def __init__(self):
+        self.labels = []
+        # proposition -> its last row
+        self.index = {}
+        self._positions = np.empty((0, 2), dtype=float)
+        self._parent = np.empty(0, dtype=np.int64)
+        self._line_type = np.empty(0, dtype=np.int8)
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def positions(self):
+        return self._positions[:len(self.labels)]
+
+    @property
+    def parent(self):
+        return self._parent[:len(self.labels)]
+
+    @property
+    def line_type(self):
+        return self._line_type[:len(self.labels)]
+
+    def reset(self, labels, positions):
+        """
+        Replaces all propositions; edges are cleared.
+        :param labels: a list of propositions
+        :param positions: an (n, 2) float array
+        """
+        self.labels = list(labels)
+        self.index = dict(zip(self.labels, range(len(self.labels))))
+        self._positions = positions
+        self._parent = np.full(len(self.labels), -1, dtype=np.int64)
+        self._line_type = np.full(len(self.labels), -1, dtype=np.int8)
+
+    def set_edges(self, child, parent, line_type):
+        """
+        Connects each of rows `child` to the row in `parent` with a line of type `line_type`.
+        """
+        self._parent[child] = parent
+        self._line_type[child] = line_type
+
+    def append(self, label, x, y, parent=-1, line_type=-1):
+        """
+        Adds one proposition, and its edge if `parent` >= 0.
+        """
+        idx = len(self.labels)
+        if idx == len(self._parent):
+            capacity = max(2 * idx, 64)
+            self._positions = _grow(self._positions, capacity)
+            self._parent = _grow(self._parent, capacity)
+            self._line_type = _grow(self._line_type, capacity)
+        self._positions[idx] = (x, y)
+        self._parent[idx] = parent
+        self._line_type[idx] = line_type
+        self.labels.append(label)
+        self.index[label] = idx
+
+    def extend(self, labels, positions, parent, line_type):
+        """
+        Adds a block of propositions, see `append`.
+        :param labels: a list of propositions
+        :param positions: an (n, 2) float array
+        :param parent: rows drawn from, -1 for none
+        :param line_type: line type codes, -1 for none
+        """
+        start, stop = len(self.labels), len(self.labels) + len(labels)
+        if stop > len(self._parent):
+            capacity = max(2 * len(self._parent), stop, 64)
+            self._positions = _grow(self._positions, capacity)
+            self._parent = _grow(self._parent, capacity)
+            self._line_type = _grow(self._line_type, capacity)
+        self._positions[start:stop] = positions
+        self._parent[start:stop] = parent
+        self._line_type[start:stop] = line_type
+        self.labels.extend(labels)
+        self.index.update(zip(labels, range(start, stop)))
+
+    def edges(self):
+        """
+        Returns the rows at both ends of every edge and its line type code, as (parent, child, line_type) arrays.
+        """
+        child = np.flatnonzero(self.parent >= 0)
+        return self.parent[child], child, self.line_type[child]
+
+    def to_networkx(self):
+        """
+        Builds the equivalent networkx graph: propositions as nodes with a `pos` attribute, edges added parent by
+        parent with a `line_type` attribute.
+        """
+        # networkx is only imported by callers asking for it
+        import networkx as nx
+
+        graph = nx.Graph()
+        positions = self.positions.tolist()
+        graph.add_nodes_from((label, {'pos': positions[idx]}) for label, idx in self.index.items())
+        parent, child, line_type = self.edges()
+        order = np.lexsort((child, parent))
+        graph.add_edges_from((self.labels[parent[i]], self.labels[child[i]],
+                              {'line_type': LINE_TYPE_NAMES[line_type[i]]}) for i in order)
+        return graph
+
+
+class GrowableArray(object):
+    """
+    An array with room to grow at its end, so appending takes O(1) amortized time, as ArrayGraph's arrays do.
+    """
+
+    def __init__(self, values):
+        self._array = values
+        self._size = len(values)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def values(self):
+        """
+        What was added so far, as a read-only view.
+        """
+        values = self._array[:self._size].view()
+        values.flags.writeable = False
+        return values
+
+    def extend(self, values):
+        """
+        Adds the rows of `values` at the end.
+        """
+        stop = self._size + len(values)
+        if stop > len(self._array):
+            self._array = _grow(self._array[:self._size], max(2 * self._size, stop, 64))
+        self._array[self._size:stop] = values
+        self._size = stop
+
+
+def _grow(array, capacity):
+    grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
@@ -0,0 +1,100 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+This module holds background jobs for uploads: a big file is decoded, parsed, and checked on a thread pool while the
+worker keeps serving other requests, and the browser polls for the job's progress.
+"""
+
+
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.files import atomic_path, private_directory
+from src.store import TOKEN_PATTERN
+
+# a running job whose progress has not moved for this many seconds is taken as lost, e.g. with a restarted worker
+JOB_TIMEOUT = 10 * 60
+# progress is written when the stage changes or the fraction done grows by at least this much
+PROGRESS_STEP = 0.05
+
+
+class JobRunner(object):
+    """
+    Runs jobs on a thread pool, keyed by a `content_hash` token. A job's state is written to a small JSON file in
+    `directory`, so a poll reaching any worker process of the app can report on it:
+        {'state': 'running', 'stage': ..., 'fraction': a float or None}
+        {'state': 'done', 'result': what the job returned}
+        {'state': 'failed', 'error': ...}
+    Safe to share between threads.
+    """
+
+    def __init__(self, directory, max_workers=2):
+        self.directory = private_directory(directory)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upload_job')
+        # tokens of the jobs running in this process
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def _path(self, token):
+        return os.path.join(self.directory, f'{token}.job.json')
+
+    def _write(self, token, status):
+        with atomic_path(self._path(token)) as tmp_path:
+            with open(tmp_path, 'w') as f:
+                json.dump(status, f)
+
+    def submit(self, token, function, *args):
+        """
+        Runs `function(*args, progress=...)` in the background, unless a job for `token` is already running here.
+        `progress` takes a stage name and the fraction of it done (None if unknown). The JSON-serializable value
+        `function` returns is the job's result.
+        """
+        if not TOKEN_PATTERN.fullmatch(token):
+            raise ValueError(f'Malformed job token: {token!r}')
+        with self._lock:
+            if token in self._running:
+                return
+            self._running.add(token)
+        self._write(token, {'state': 'running', 'stage': 'queued', 'fraction': None})
+        self.executor.submit(self._run, token, function, args)
+
+    def _run(self, token, function, args):
+        last = {'stage': 'queued', 'fraction': None}
+
+        def progress(stage, fraction=None):
+            # write only when there is something new to show
+            if stage == last['stage'] and (fraction is None or
+                                           (last['fraction'] is not None and fraction - last['fraction'] < PROGRESS_STEP)):
+                return
+            last.update(stage=stage, fraction=fraction)
+            self._write(token, {'state': 'running', 'stage': stage, 'fraction': fraction})
+
+        try:
+            status = {'state': 'done', 'result': function(*args, progress=progress)}
+        except Exception as e:
+            status = {'state': 'failed', 'error': f'{type(e).__name__}: {e}'}
+        try:
+            self._write(token, status)
+        finally:
+            with self._lock:
+                self._running.discard(token)
+
+    def status(self, token):
+        """
+        Returns the state of the job for `token`, see the class docstring, None if there is none.
+        """
+        if not isinstance(token, str) or not TOKEN_PATTERN.fullmatch(token):
+            return None
+        path = self._path(token)
+        try:
+            with open(path) as f:
+                status = json.load(f)
+            modified = os.path.getmtime(path)
+        except (OSError, ValueError):
+            return None
+        if status['state'] == 'running' and time.time() - modified > JOB_TIMEOUT:
+            return {'state': 'failed', 'error': 'The job stopped responding.'}
+        return status
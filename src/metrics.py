@@ -0,0 +1,102 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+This module holds the semantic distance metrics accumulator.
+"""
+
+
+import numpy as np
+import pandas as pd
+
+
+class SemanticDistanceMetrics(object):
+    """
+    Accumulates semantic distances (x coordinates) and reports the metrics shown under a graph: the maximum
+    (accumulated semantic distance), the mean, and the mean over P propositions.
+    Counts and sums are also kept per relation type and per speaker. Rows are added in bulk with `extend` (one
+    vectorized pass) or one at a time with `update` (O(1)).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = np.nan
+        # relation type/speaker -> [count, sum]
+        self.by_relation_type = {}
+        self.by_speaker = {}
+
+    def extend(self, x, relation_type, speaker=None):
+        """
+        Adds many propositions at once.
+        :param x: semantic distances, an array
+        :param relation_type: relation type of each proposition
+        :param speaker: speaker of each proposition, optional
+        :return:
+        """
+        x = np.asarray(x, dtype=float)
+        if len(x) == 0:
+            return
+        self.count += len(x)
+        self.total += float(x.sum())
+        self.maximum = float(x.max()) if self.maximum != self.maximum else max(self.maximum, float(x.max()))
+        _add_grouped(self.by_relation_type, x, relation_type)
+        if speaker is not None:
+            _add_grouped(self.by_speaker, x, speaker)
+
+    def update(self, x, relation_type, speaker=None):
+        """
+        Adds one proposition.
+        """
+        x = float(x)
+        self.count += 1
+        self.total += x
+        self.maximum = x if self.maximum != self.maximum else max(self.maximum, x)
+        _add_one(self.by_relation_type, x, relation_type)
+        if speaker is not None:
+            _add_one(self.by_speaker, x, speaker)
+
+    @property
+    def accumulated(self):
+        return self.maximum
+
+    @property
+    def mean(self):
+        return round(self.total / self.count, 3) if self.count else np.nan
+
+    @property
+    def mean_only_for_P(self):
+        count, total = self.by_relation_type.get('P', (0, 0.0))
+        return round(total / count, 3) if count else np.nan
+
+    def breakdown(self, by='relation_type'):
+        """
+        Reports count, sum, and mean of semantic distance per relation type or per speaker.
+        :param by: 'relation_type' or 'speaker'
+        :return: a DataFrame indexed by relation type/speaker
+        """
+        groups = self.by_relation_type if by == 'relation_type' else self.by_speaker
+        table = pd.DataFrame.from_dict(groups, orient='index', columns=['count', 'sum'])
+        table['mean'] = (table['sum'] / table['count']).round(3)
+        return table
+
+
+def _add_grouped(groups, x, keys):
+    """
+    Adds counts and sums of `x` grouped by `keys` into `groups`, skipping missing keys.
+    """
+    keys_id, uniques = pd.factorize(keys)
+    present = keys_id >= 0
+    counts = np.bincount(keys_id[present], minlength=len(uniques))
+    sums = np.bincount(keys_id[present], weights=x[present], minlength=len(uniques))
+    for key, count, total in zip(uniques.tolist(), counts.tolist(), sums.tolist()):
+        group = groups.setdefault(key, [0, 0.0])
+        group[0] += count
+        group[1] += total
+
+
+def _add_one(groups, x, key):
+    if key is None or pd.isna(key):
+        return
+    group = groups.setdefault(key, [0, 0.0])
+    group[0] += 1
+    group[1] += x
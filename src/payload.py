@@ -0,0 +1,71 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+This module holds the figure payload path: figure dicts (see `DTA.figure_dict`) are encoded once with orjson, NumPy
+arrays included, and the bytes are spliced into Dash's callback responses as they are, instead of going through
+plotly's JSON encoder, which encodes, decodes, and encodes every figure again.
+"""
+
+
+import uuid
+import itertools
+
+import flask
+import numpy as np
+import orjson
+import pandas as pd
+
+OPTIONS = orjson.OPT_SERIALIZE_NUMPY
+# stands in for an encoded figure in a Dash response until `splice` swaps the figure in; unique to this process
+PLACEHOLDER = '__visualdta_figure_' + uuid.uuid4().hex + '_{}__'
+_ids = itertools.count()
+
+
+def _default(obj):
+    """
+    Encodes what orjson does not encode natively: strided or object arrays, and pandas' missing values.
+    """
+    if isinstance(obj, np.ndarray):
+        return obj.tolist() if obj.dtype == object else np.ascontiguousarray(obj)
+    if obj is pd.NA or obj is pd.NaT:
+        return None
+    raise TypeError(f'Type is not JSON serializable: {type(obj).__name__}')
+
+
+def encode_figure(figure):
+    """
+    Encodes a figure dict, or a go.Figure, as JSON bytes; NaN and missing values become null, as with plotly's encoder.
+    """
+    if hasattr(figure, 'to_plotly_json'):
+        figure = figure.to_plotly_json()
+    return orjson.dumps(figure, default=_default, option=OPTIONS)
+
+
+class RawFigure(object):
+    """
+    An encoded figure to return from a Dash callback, e.g. as dcc.Graph's `figure`. Only works while the callback's
+    request is served and `splice` is registered with the server.
+    """
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def to_plotly_json(self):
+        # called by plotly's encoder as Dash encodes the response
+        key = PLACEHOLDER.format(next(_ids))
+        flask.g.setdefault('raw_figures', {})[key] = self.payload
+        return key
+
+
+def splice(response):
+    """
+    Swaps encoded figures in for their placeholders in a Dash response. Register with `server.after_request` after
+    the app is created, so it runs before the response is compressed.
+    """
+    figures = flask.g.pop('raw_figures', None)
+    if figures:
+        body = response.get_data()
+        for key, payload in figures.items():
+            body = body.replace(b'"' + key.encode() + b'"', payload, 1)
+        response.set_data(body)
+    return response
@@ -6,11 +6,19 @@ This module holds functions for i/o and checking.
 
 
 import io
-import base64
-import chardet
+import os
+import codecs
+import zipfile
+import binascii
+import threading
 import numpy as np
 import pandas as pd
-from collections import Counter
+from collections import Counter, namedtuple
+
+from src.cache import content_hash
+from src.files import atomic_path, private_directory
+from src.timing import timed
+from src.dta import DTA, RELATION_TYPES, ROOT_RELATION_TYPE, layout_arrays, relation_type_code
 
 UNKNOWN = ['n/a', 'N/A', 'na', 'NA', 'Na', np.nan, 'unknown', 'UNKNOWN', '?', '??', "???"]
 YES = [1, 'yes', 'y', 'Yes', 'YES', 'Y']
@@ -21,39 +29,202 @@ TYPES = ['B', 'P', 'T']
 
 HEADINGS = {'Proposition', 'Speaker', 'Responds To', 'Relation Type', 'Distance', 'Line Type', 'Text'}
 LOWER_HEADINGS = set(str.lower(h) for h in HEADINGS)
+# the heading older transcripts, e.g. the demos in ./samples, have instead of `Line Type`: yes for a dotted line,
+# anything else for a solid one; see `legacy_line_type`
+LEGACY_LINE_HEADING = 'Dotted Line'
+
+# byte order marks, longest first since the UTF-32 LE mark starts with the UTF-16 LE one
+BOMS = [(codecs.BOM_UTF32_LE, 'utf-32'),
+        (codecs.BOM_UTF32_BE, 'utf-32'),
+        (codecs.BOM_UTF8, 'utf-8-sig'),
+        (codecs.BOM_UTF16_LE, 'utf-16'),
+        (codecs.BOM_UTF16_BE, 'utf-16')]
+# chardet looks at no more than this many leading bytes of an upload
+ENCODING_SAMPLE_BYTES = 64 * 1024
+# bytes fed to chardet's UniversalDetector at a time
+ENCODING_CHUNK_BYTES = 4 * 1024
+# bytes checked at a time when validating an encoding
+DECODE_CHUNK_BYTES = 1024 * 1024
+# tried in turn when chardet's guess does not decode the whole upload; every byte sequence is valid latin-1
+FALLBACK_ENCODINGS = ['cp1252', 'latin-1']
+# base64 characters decoded at a time, a multiple of 4
+BASE64_CHUNK_CHARS = 4 * 1024 * 1024
+# compact dtypes for streamed transcripts; nullable integers, since the root row leaves `Responds To` and `Distance` blank
+COMPACT_DTYPES = {'Proposition': 'Int32',
+                  'Responds To': 'Int32',
+                  'Distance': 'Int8',
+                  'Relation Type': 'category',
+                  'Speaker': 'category',
+                  'Line Type': 'category'}
+# rows parsed at a time by `read_transcript_chunks`
+CHUNK_ROWS = 100000
+# Excel cells read as missing, the strings pandas treats as missing by default
+NA_STRINGS = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>', 'N/A',
+              'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+# how uploads' encodings were found: 'bom', 'utf-8', 'chardet', 'chardet_incremental', or 'fallback' -> count
+encoding_paths = Counter()
+_encoding_paths_lock = threading.Lock()
+
+# one broken rule: the row (None for the whole file) and column it was found in
+Violation = namedtuple('Violation', ['row', 'column', 'rule'])
+# rule -> what is wrong, for feedback
+RULES = {'missing_heading': 'Heading is missing.',
+         'too_short': 'There should be at least two propositions.',
+         'blank': 'Should not be blank or "NA".',
+         'root_not_blank': 'Should be "NA" in the first row.',
+         'duplicate': 'Proposition appears more than once.',
+         'unknown_parent': 'Responds to a proposition that does not exist.',
+         'forward_reference': 'Responds to a proposition that does not come before it.',
+         'relation_type': f'Relation type should be one of {list(RELATION_TYPES)}.',
+         'distance': 'Distance does not fit the relation type (T: 0, P: 1, 2, or 3, B: 4).',
+         'line_type': 'Line type should be 0 (no line), 1 (solid line), or 2 (dotted line).'}
+# violations listed in feedback, the rest are only counted
+MAX_VIOLATIONS = 20
 
 MD_UPLOAD_FAIL = """**😭 Uploading Failed**.  
         Please upload data in comma/tab-separated values (`.csv`/`.tsv`/`.txt`) or Excel (`.xlsx`/`.xls`) format and use the right suffix accordingly.
         
         """
 
-MD_FEEDBACK_HEADING = f"""Please make sure the following seven headings are specified: {list(HEADINGS)}. Headings are case- and sequence-insensitive, but space within a heading matters. If you do not need "Dotted Line" or "Text," leave all values below as "NA". We recommend using the provided template."""
+MD_FEEDBACK_HEADING = f"""Please make sure the following seven headings are specified: {list(HEADINGS)}. Headings are sequence-insensitive, but case and space within a heading matter. If you do not need "Dotted Line" or "Text," leave all values below as "NA". We recommend using the provided template."""
+
+
+def decode_data_url(contents):
+    """
+    Decodes a base64 data URL, as dcc.Upload hands it over, chunk by chunk into a BytesIO, so neither the base64
+    payload nor the decoded file is copied whole on the way.
+    """
+    start = contents.index(',') + 1
+    buffer = io.BytesIO()
+    for i in range(start, len(contents), BASE64_CHUNK_CHARS):
+        buffer.write(binascii.a2b_base64(contents[i:i + BASE64_CHUNK_CHARS]))
+    buffer.seek(0)
+    return buffer
+
+
+def _decodes(data, encoding):
+    """
+    Whether all of `data` decodes with `encoding`, checked a chunk at a time, so no str of the whole file is built.
+    """
+    try:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        for start in range(0, len(data), DECODE_CHUNK_BYTES):
+            decoder.decode(data[start:start + DECODE_CHUNK_BYTES])
+        decoder.decode(b'', final=True)
+    except (UnicodeDecodeError, LookupError):
+        return False
+    return True
+
+
+def detect_encoding(data, sample_bytes=ENCODING_SAMPLE_BYTES, incremental=True):
+    """
+    Guesses the encoding of `data` at a bounded cost: a byte order mark, then a strict UTF-8 check, then chardet over
+    at most the first `sample_bytes` bytes. A guess that does not decode the whole of `data`, e.g. 'ascii' for a file
+    whose first non-ASCII byte comes after the sample, gives way to FALLBACK_ENCODINGS.
+    :param data: bytes, or a memoryview of them
+    :param incremental: feed chardet's UniversalDetector chunk by chunk and stop once it is confident; otherwise run
+                        `chardet.detect` on the whole sample
+    :return: (encoding, path), path being one of the keys of `encoding_paths`
+    """
+    head = bytes(data[:4])
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding, 'bom'
+    if _decodes(data, 'utf-8'):
+        return 'utf-8', 'utf-8'
+    # chardet is imported on the first upload that is not UTF-8, rather than at startup
+    sample = bytes(data[:sample_bytes])
+    if incremental:
+        from chardet import UniversalDetector
+        detector = UniversalDetector()
+        for start in range(0, len(sample), ENCODING_CHUNK_BYTES):
+            detector.feed(sample[start:start + ENCODING_CHUNK_BYTES])
+            if detector.done:
+                break
+        detector.close()
+        encoding, path = detector.result['encoding'], 'chardet_incremental'
+    else:
+        import chardet
+        encoding, path = chardet.detect(sample)['encoding'], 'chardet'
+    if encoding is not None and _decodes(data, encoding):
+        return encoding, path
+    for encoding in FALLBACK_ENCODINGS[:-1]:
+        if _decodes(data, encoding):
+            return encoding, 'fallback'
+    return FALLBACK_ENCODINGS[-1], 'fallback'
+
+
+def upload_encoding(buffer):
+    """
+    Detects the encoding of an uploaded text file held in a BytesIO, see `detect_encoding`, and counts the path
+    taken in `encoding_paths`.
+    """
+    with buffer.getbuffer() as view:
+        encoding, path = detect_encoding(view)
+    with _encoding_paths_lock:
+        encoding_paths[path] += 1
+    return encoding
+
+
+def encoding_path_counts():
+    """
+    Copies `encoding_paths`, which upload jobs may be updating meanwhile.
+    """
+    with _encoding_paths_lock:
+        return dict(encoding_paths)
+
+
+def _no_progress(stage, fraction=None):
+    pass
 
 
-def read_in_uploaded(contents, filename):
+def _parse_progress(chunks, buffer, progress):
+    """
+    Passes `chunks` on, reporting the share of `buffer` parsed so far.
+    """
+    size = max(buffer.getbuffer().nbytes, 1)
+    progress('parsing', 0.0)
+    for chunk in chunks:
+        progress('parsing', min(buffer.tell() / size, 1.0))
+        yield chunk
+
+
+@timed('read_in_uploaded', rows=lambda result, *args, **kwargs: len(result) if isinstance(result, pd.DataFrame) else None)
+def read_in_uploaded(contents, filename, progress=None):
     """
     Reads in a user uploaded file.
+    :param progress: called with a stage name and the fraction of it done (None if unknown) as the file is decoded
+                     and parsed, optional
     """
-    # def parse_data_upload(contents, filename):
-    content_type, content_string = contents.split(',')
-    # decoded is "bytes"
-    decoded = base64.b64decode(content_string)
-    # detect file's encoding scheme
-    codec = chardet.detect(decoded)
+    progress = _no_progress if progress is None else progress
+    progress('decoding')
+    # decoded bytes, pandas parses them in place given their encoding
+    buffer = decode_data_url(contents)
 
     if "csv" == filename.split('.')[-1]:
         try:
-            df = pd.read_csv(io.StringIO(decoded.decode(codec['encoding'])))
+            progress('detecting encoding')
+            encoding = upload_encoding(buffer)
+            df = concat_chunks(_parse_progress(read_transcript_chunks(buffer, encoding=encoding, text=True),
+                                               buffer, progress))
         except ValueError:
             df = MD_UPLOAD_FAIL
     elif "xls" in filename.split('.')[-1]:
         try:
-            df = pd.read_excel(io.BytesIO(decoded), sheet_name="Sheet1")
+            progress('parsing')
+            if filename.split('.')[-1] == 'xlsx':
+                df = read_excel_fast(buffer)
+            else:
+                # legacy .xls needs xlrd
+                df = legacy_line_type(pd.read_excel(buffer, sheet_name="Sheet1"))
         except ValueError:
             df = MD_UPLOAD_FAIL
     elif "txt" == filename.split('.')[-1] or "tsv" == filename.split('.')[-1]:
         try:
-            df = pd.read_csv(io.StringIO(decoded.decode(codec['encoding'])), delimiter="\t")
+            progress('detecting encoding')
+            encoding = upload_encoding(buffer)
+            df = concat_chunks(_parse_progress(read_transcript_chunks(buffer, delimiter="\t", encoding=encoding, text=True),
+                                               buffer, progress))
         except ValueError:
             df = MD_UPLOAD_FAIL
     else:
@@ -62,252 +233,369 @@ def read_in_uploaded(contents, filename):
     return df
 
 def read_in_demo(filepath='./samples/BiliBili_comments.xlsx',
-                 filename='BiliBili_comments.xlsx'):
+                 filename='BiliBili_comments.xlsx',
+                 cache_dir=None):
     """
-    Reads in an example.
+    Reads in an example, see `read_in_file`.
+    :return: a DataFrame, or feedback on why the file could not be read in
     """
     try:
-        if 'xlsx' in filename:
-            df = pd.read_excel(filepath)
-            return df
-        elif 'txt' in filename:
-            df = pd.read_csv(filepath, delimiter='\t')
-            return df
-        elif 'csv' in filename:
-            df = pd.read_csv(filepath)
-            return df
-    except Exception as e:
-        # print(e)
-        # print(filename)
-        df = '**Demo Failed**. Please check the validity of the demo file.'
-        return df
-
-def check_heading(df):
-    """
-    Checks if HEADINGS is a subset of input headings.
-    Headings should be included: Proposition/Speaker/Responds To/Relation Type/Distance/Dotted Line/Text.
-    Case-insensitive, sequence-insensitive.
-    """
-    feedback = """
-
-**Heading check**:
+        return read_in_file(filepath, filename, cache_dir=cache_dir)
+    except Exception:
+        return '**Demo Failed**. Please check the validity of the demo file.'
 
-"""
-    unique_lower_headings = set(str.lower(h) for h in set(df.columns))
-    if len(unique_lower_headings) == 7 and unique_lower_headings == LOWER_HEADINGS:
-        # desired situation: 7 headings without overlap
-        feedback += "The pre-defined headings look good.  "
-    elif len(unique_lower_headings) == 7 and unique_lower_headings != LOWER_HEADINGS:
-        # overlap exists
-        count_headings = Counter(df.columns)
-        overlap = [key for key in count_headings.keys() if count_headings[key] >= 2]
-        feedback += f"Multiple {overlap} exist."
-    elif len(unique_lower_headings) < 7:
-        missing = set(str.capitalize(h) for h in (LOWER_HEADINGS - unique_lower_headings))
-        redundant = set(str.capitalize(h) for h in (unique_lower_headings - LOWER_HEADINGS))
-        feedback += f"Heading {[str.capitalize(h) for h in list(missing)]} {'is' if len(missing) == 1 else 'are'} missing."
-        if not unique_lower_headings.issubset(HEADINGS):
-            # wrong headings exist
-            feedback += f" We are not going to use the values below Heading {[str.capitalize(h) for h in list(redundant)]}"
-        else:
+
+def read_in_file(filepath, filename=None, cache_dir=None):
+    """
+    Reads in a transcript on disk: .xlsx, legacy .xls (needs xlrd), tab-separated .txt/.tsv, or .csv. Text files are
+    decoded in the encoding `detect_encoding` finds, as uploads are.
+    :param filename: the name whose suffix tells the format, `filepath` by default
+    :param cache_dir: where parsed .xlsx files are cached, see `read_excel_fast`
+    :return: a DataFrame; whatever stops the file from being read in is raised, e.g. a ValueError for an unknown suffix
+    """
+    suffix = os.path.splitext(filepath if filename is None else filename)[1].lower()
+    if suffix == '.xlsx':
+        return read_excel_fast(filepath, cache_dir=cache_dir)
+    elif suffix == '.xls':
+        return legacy_line_type(pd.read_excel(filepath, sheet_name=0))
+    elif suffix in ('.txt', '.tsv', '.csv'):
+        with open(filepath, 'rb') as f:
+            buffer = io.BytesIO(f.read())
+        with buffer.getbuffer() as view:
+            encoding, path = detect_encoding(view)
+        delimiter = ',' if suffix == '.csv' else '\t'
+        return concat_chunks(read_transcript_chunks(buffer, delimiter=delimiter, encoding=encoding, text=True))
+    raise ValueError(f'unsupported suffix {suffix!r}')
+
+
+def read_excel_fast(source, sheet_name=None, cache_dir=None):
+    """
+    Reads the HEADINGS columns of an .xlsx transcript, streaming rows from a read-only workbook instead of building
+    every cell of every column, and converts them to COMPACT_DTYPES.
+    :param source: a path or a file-like object
+    :param sheet_name: the sheet to read; by default the first whose header row has the most HEADINGS
+    :param cache_dir: if given, the parsed frame is pickled here under a hash of the file, and read back from there the
+                      next time the same file comes in. Unpickling runs code, so the directory must be trusted: it is
+                      created private to this user, and an existing one that another user could write to is refused
+                      with a PermissionError, see `files.private_directory`
+    :return: a DataFrame; a ValueError is raised for files that are not workbooks
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            data = f.read()
+    else:
+        data = source.read()
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(private_directory(cache_dir), f'{content_hash(data, sheet_name)}.pkl')
+        try:
+            return pd.read_pickle(cache_path)
+        except (OSError, ValueError):
             pass
-    elif len(unique_lower_headings) > 7:
-        # seven desired headings are correctly specified
-        if HEADINGS.issubset(unique_lower_headings):
-            extra = set(str.capitalize(h) for h in (unique_lower_headings - LOWER_HEADINGS))
-            feedback += f"Required headings are all specified correctly. " \
-                        f"No check will be perform on extra heading{'' if len(extra) == 1 else 's'} {[str.capitalize(h) for h in extra]}, which may cause consequences."
-        else:
-            missing = set(str.capitalize(h) for h in (LOWER_HEADINGS - unique_lower_headings))
-            redundant_or_overlap = set(str.capitalize(h) for h in (unique_lower_headings - LOWER_HEADINGS))
-            if len(missing) > 0:
-                feedback += f"Heading {[str.capitalize(h) for h in list(missing)]} {'is' if len(missing) == 1 else 'are'} missing.  "
-            else:
-                pass
-            if redundant_or_overlap is not set():
-                feedback += f"Heading {[str.capitalize(h) for h in list(redundant_or_overlap)]} {'looks' if len(redundant_or_overlap) == 1 else 'look'} suspicious." \
-                            f" We are not going to use the values below {'it' if len(redundant_or_overlap) == 1 else 'them'}.  "
-            else:
+
+    # openpyxl is imported on the first Excel file rather than at startup
+    import openpyxl
+    try:
+        workbook = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    except (zipfile.BadZipFile, KeyError, OSError) as e:
+        raise ValueError(f'Not an .xlsx workbook: {e}')
+    try:
+        if sheet_name is None:
+            headers = {name: next(workbook[name].iter_rows(max_row=1, values_only=True), ()) for name in workbook.sheetnames}
+            sheet_name = max(workbook.sheetnames, key=lambda name: len(HEADINGS.intersection(headers[name])))
+        sheet = workbook[sheet_name]
+        header = next(sheet.iter_rows(max_row=1, values_only=True), ())
+        # the first column of each heading, as pandas would keep it
+        wanted = {}
+        for i, heading in enumerate(header):
+            if (heading in HEADINGS or heading == LEGACY_LINE_HEADING) and heading not in wanted:
+                wanted[heading] = i
+        columns = {heading: [] for heading in wanted}
+        width = max(wanted.values(), default=-1) + 1
+        # columns past the last heading are never parsed into cells
+        rows = sheet.iter_rows(min_row=2, max_col=max(width, 1), values_only=True)
+        count = last = 0
+        for row in rows:
+            count += 1
+            row = row[:width] + (None,) * (width - len(row))
+            blank = True
+            for heading, i in wanted.items():
+                value = row[i]
+                if value is None or (isinstance(value, str) and value in NA_STRINGS):
+                    value = None
+                else:
+                    blank = False
+                columns[heading].append(value)
+            if not blank:
+                last = count
+    finally:
+        workbook.close()
+    # trailing blank rows are formatting, not data
+    df = pd.DataFrame({heading: pd.Series(values[:last], dtype=object) for heading, values in columns.items()})
+    df = df.infer_objects()
+    # missing values as pandas reads them, NaN rather than None
+    for column in df.columns[df.dtypes == object]:
+        df[column] = df[column].where(df[column].notna(), np.nan)
+    df = compact_dtypes(df)
+
+    if cache_path is not None:
+        with atomic_path(cache_path) as tmp_path:
+            df.to_pickle(tmp_path)
+    return df
+
+
+def legacy_line_type(df):
+    """
+    Turns the `Dotted Line` column of an older transcript into `Line Type`, in place: 2 (dotted line) where it says
+    yes, 1 (solid line) elsewhere. Transcripts that already have `Line Type` are left as they are.
+    """
+    if LEGACY_LINE_HEADING in df and 'Line Type' not in df:
+        dotted = df[LEGACY_LINE_HEADING]
+        df['Line Type'] = np.where(dotted.astype(object).isin(YES).to_numpy(), 2, 1)
+        del df[LEGACY_LINE_HEADING]
+    return df
+
+
+def compact_dtypes(chunk):
+    """
+    Converts the columns of a chunk to COMPACT_DTYPES where their values allow it, e.g. `Proposition` stays as it is
+    if a value is not an integer. A `Dotted Line` column is turned into `Line Type` first, see `legacy_line_type`.
+    """
+    legacy_line_type(chunk)
+    for column, dtype in COMPACT_DTYPES.items():
+        if column in chunk:
+            try:
+                chunk[column] = chunk[column].astype(dtype)
+            except (TypeError, ValueError):
                 pass
-    else:
-        pass
-    feedback += MD_FEEDBACK_HEADING if feedback != """
+    return chunk
+
 
-**Heading check**:
+def read_transcript_chunks(source, delimiter=',', encoding=None, chunksize=CHUNK_ROWS, text=False):
+    """
+    Parses a csv/tsv transcript `chunksize` rows at a time, yielding chunks with COMPACT_DTYPES, so only one chunk is
+    ever held as parsed strings. Feed the chunks to `DTA.extend` to lay out a transcript of any length, or join them
+    with `concat_chunks`.
+    :param source: a path or a file-like object
+    :param text: also read `Text`, only needed for annotations and hover labels, see `read_text`
+    """
+    def usecols(column):
+        return (column in HEADINGS and (text or column != 'Text')) or column == LEGACY_LINE_HEADING
 
-""" else "Looks good.  "
+    for chunk in pd.read_csv(source, delimiter=delimiter, encoding=encoding, usecols=usecols, chunksize=chunksize):
+        yield compact_dtypes(chunk)
 
-    return feedback
 
-def check_minimal_length(df):
+def concat_chunks(chunks):
+    """
+    Joins chunks from `read_transcript_chunks`, keeping categorical columns categorical.
+    """
+    chunks = list(chunks)
+    if not chunks:
+        return pd.DataFrame(columns=list(COMPACT_DTYPES))
+    for column, dtype in COMPACT_DTYPES.items():
+        if dtype == 'category' and all(isinstance(chunk.get(column), pd.Series) and
+                                       isinstance(chunk[column].dtype, pd.CategoricalDtype) for chunk in chunks):
+            # chunks see different categories, give them all the union so concatenation does not fall back to object
+            categories = chunks[0][column].cat.categories
+            for chunk in chunks[1:]:
+                categories = categories.union(chunk[column].cat.categories, sort=False)
+            for chunk in chunks:
+                chunk[column] = chunk[column].cat.set_categories(categories)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def read_text(source, delimiter=',', encoding=None):
     """
-    Checks if the `proposition` has at least two values
+    Reads only the `Text` column of a csv/tsv transcript, as a loader for `DTA(text=...)`.
     """
-    feedback = """
-    
-**Minimal length check**:
+    return pd.read_csv(source, delimiter=delimiter, encoding=encoding, usecols=['Text']).Text
 
-"""
-    feedback += """Looks good.""" if df['Proposition'].count() >= 2 else """Proposition count is too short (less than two)."""
-    return feedback
 
-def check_equal_length(df):
+class ValidationReport(object):
     """
-    Checks whether each column has the same length to `Proposition` column.
+    What `validate` found: the first `max_violations` violations in row order, and the number of violations of each
+    rule.
     """
-    feedback = """
 
-**Equal length check**:
+    def __init__(self, violations, counts, max_violations=MAX_VIOLATIONS):
+        self.violations = violations
+        self.counts = counts
+        self.max_violations = max_violations
+
+    @property
+    def ok(self):
+        return not self.counts
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def to_markdown(self):
+        """
+        Formats the report as upload feedback, rows numbered as in a spreadsheet (the heading being row 1).
+        """
+        feedback = """
+
+**Validity check**:
 
 """
-    proposition_values_count = len(df.Proposition)
-    heading_of_diff_len = set(heading if len(df[heading]) != proposition_values_count else None for heading in HEADINGS) - {None}
-    if len(heading_of_diff_len) != 0:
-        feedback += f"""The length of {[h for h in heading_of_diff_len]} {
-        'is' if len({heading_of_diff_len})==1 else 'are'} not equal to the length of the "Proposition" column.  """
-    else:
-        pass
-    feedback += """Looks good.""" if feedback == """
+        if self.ok:
+            return feedback + "Looks good."
+        for violation in self.violations:
+            where = 'File' if violation.row is None else f'Row {violation.row + 2}'
+            feedback += f'- {where}, "{violation.column}": {RULES[violation.rule]}\n'
+        if self.total > len(self.violations):
+            feedback += f'- ... and {self.total - len(self.violations)} more.\n'
+        if 'missing_heading' in self.counts:
+            feedback += '\n' + MD_FEEDBACK_HEADING
+        feedback += """
+
+Please check the file regarding the above messages. Or you can proceed to visualize, but it may not work as expected, if at all."""
+        return feedback
+
+
+def check_heading(df, arrays):
+    """
+    Checks if HEADINGS are all in `df`. Other checks skip the columns missing.
+    """
+    return [('missing_heading', heading, None) for heading in sorted(HEADINGS - set(df.columns))]
+
+
+def check_minimal_length(df, arrays):
+    """
+    Checks if `Proposition` has at least two values.
+    """
+    if 'Proposition' in df and df.Proposition.count() < 2:
+        return [('too_short', 'Proposition', None)]
+    return []
+
 
-**Equal length check**:
+def check_blank_value(df, arrays):
+    """
+    Checks that `Proposition` and `Speaker` are never blank, and that `Responds To`, `Relation Type`, and `Distance`
+    are only blank in the first row.
+    """
+    found = []
+    for column in ['Proposition', 'Speaker']:
+        if column in df:
+            found.append(('blank', column, np.flatnonzero(df[column].isna().to_numpy())))
+    for column in ['Responds To', 'Relation Type', 'Distance']:
+        if column in df:
+            found.append(('blank', column, np.flatnonzero(df[column].isna().to_numpy()[1:]) + 1))
+    return found
 
-""" else ""
-    return feedback
 
-def check_first_row(df):
+def check_first_row(df, arrays):
     """
-    Checks if the first row is legal.
-    The rules are:
-        1. the first value under `Proposition` should be "0"
-        2. three headings (Responds To, Relation Type, and Distance) should be "NA" (or one of the `UNKNOWN`)
-        3. two headings (Speaker and Text) should have some value
-        4. `Dotted Line` should be all of zero if not going to use.(this is not checked here, will be checked in `check_value_type`)
+    Checks that the root responds to nothing: `Responds To` and `Distance` are blank in the first row, and
+    `Relation Type` is blank or ROOT_RELATION_TYPE.
     """
-    feedback = """
-    
-**First row check**:
-    
-"""
-    # check the first value under `Proposition`
-    feedback += '' if df['Proposition'][0] == 0 else 'Please specify the first value under Proposition as "0". '
-    problematic_headings = []
-    try:
-        # the three headings
-        for heading in ['Responds To', 'Relation Type', 'Distance']:
-            problematic_headings.append(heading) if not np.isnan(df[heading][0]) else None
-        # the two headings
-        feedback += '' if df['Speaker'][0] != np.nan else 'The first value under "Speaker" should not be blank. '
-        feedback += '' if df['Text'][0] != np.nan else 'The first value under "Text" should not be blank. '
-    except:
-        pass
-    if problematic_headings != []:
-        feedback += f'''The first value{'s' if len(problematic_headings)>1 else ''} under {problematic_headings} should be "NA". '''
-    else:
-        pass
+    found = []
+    if len(df) == 0:
+        return found
+    for column in ['Responds To', 'Distance', 'Relation Type']:
+        if column in df:
+            value = df[column].iloc[0]
+            root = column == 'Relation Type' and relation_type_code(value) == ROOT_RELATION_TYPE
+            if not pd.isna(value) and not root:
+                found.append(('root_not_blank', column, np.array([0])))
+    return found
+
+
+def check_value_type(df, arrays):
+    """
+    Checks values column by column:
+    `Proposition`: no duplicates.
+    `Relation Type`: one of RELATION_TYPES, case-insensitive (excluding the first value).
+    `Distance`: a number; T=0, P=1/2/3, B=4 (excluding the first value).
+    `Line Type`: one of the no-line, solid-line, and dotted-line values DTA draws (excluding the first value).
+    """
+    found = []
+    rows = np.arange(len(df))
+    rest = rows > 0
+    if 'node_id' in arrays:
+        node_id = arrays['node_id']
+        # node ids are numbered in order of first appearance, so a row repeats a proposition unless its id is new
+        seen = np.maximum.accumulate(np.concatenate(([-1], node_id[:-1])))
+        found.append(('duplicate', 'Proposition', np.flatnonzero((node_id >= 0) & (node_id <= seen))))
+    if 'Relation Type' in df:
+        codes, uniques = pd.factorize(df['Relation Type'])
+        # distinct values are normalized once as DTA draws them, missing values are factorized to -1, which picks the
+        # trailing ''
+        relation_type = np.array([relation_type_code(value) for value in uniques] + [''], dtype=object)
+        valid = np.isin(relation_type, list(RELATION_TYPES))
+        valid[-1] = True
+        found.append(('relation_type', 'Relation Type', np.flatnonzero(~valid[codes] & rest)))
+        if 'distance' in arrays:
+            distance = arrays['distance']
+            mismatch = ((np.isnan(distance) & df.Distance.notna().to_numpy()) |
+                        ((relation_type == 'T')[codes] & (distance != 0)) |
+                        ((relation_type == 'P')[codes] & ~((distance >= 1) & (distance <= 3) & (distance % 1 == 0))) |
+                        ((relation_type == 'B')[codes] & (distance != 4)))
+            found.append(('distance', 'Distance', np.flatnonzero(mismatch & rest)))
+    if 'line_type' in arrays:
+        invalid = (arrays['line_type'] < 0) & df['Line Type'].notna().to_numpy()
+        found.append(('line_type', 'Line Type', np.flatnonzero(invalid & rest)))
+    return found
+
+
+def check_order(df, arrays):
+    """
+    Checks that every value in `Responds To` names a proposition in an earlier row (excluding the first value), the
+    way layout looks parents up.
+    """
+    if 'parent' not in arrays:
+        return []
+    parent = arrays['parent']
+    rows = np.arange(len(df))
+    responds = df['Responds To'].notna().to_numpy() & (rows > 0)
+    return [('unknown_parent', 'Responds To', np.flatnonzero(responds & (parent < 0))),
+            ('forward_reference', 'Responds To', np.flatnonzero(responds & (parent >= rows)))]
 
-    feedback += "Looks good." if feedback == """
-    
-**First row check**:
-    
-""" else ""
-    return feedback
 
-def check_blank_value(df):
+# every rule, each a vectorized pass over a column or two
+CHECKS = [check_heading, check_minimal_length, check_blank_value, check_first_row, check_value_type, check_order]
+
+
+@timed('validate', rows=lambda result, df, *args, **kwargs: len(df))
+def validate(df, max_violations=MAX_VIOLATIONS, arrays=None):
     """
-    Checks if the values under headings are blank.
-    Values under `Proposition` `Speaker` should never be blank or 'NA'.
+    Runs every check on `df`.
+    :param arrays: `dta.layout_arrays` of `df`, if already computed
+    :return: a ValidationReport listing at most `max_violations` violations, earliest rows first
     """
-    feedback = """
-    
-**Blank value check**:
-    
-"""
-    try:
-        feedback += '' if not len(
-            df.Proposition) > df.Proposition.count() else 'Values under "Proposition" should never be blank or "NA".  '
-        feedback += '' if not len(
-            df.Speaker) > df.Speaker.count() else 'Values under "Speaker" should never be blank or "NA".  '
-        # feedback += '' if len(
-        #     df.Text) > df.Text.count() else 'Values under "Text" should never be blank or "NA".  '
-    except:
-        pass
-    feedback += "Looks good." if feedback == """
-    
-**Blank value check**:
-    
-""" else ""
-    return feedback
-
-def check_value_type(df):
-    """
-    Checks if the tags has right data type.
-    `Proposition`: No overlap, no NA.
-    `Responds To`: exist in Proposition (excluding the first value)
-    `Relation Type`: T/P/B (excluding the first value)
-    `Distance`: T=0, P=1/2/3, B=4 (excluding the first value)
-    `Dotted Line`: 0 or 1 (including the first value)
-    [TODO]
-    No checks on `Speaker` and `Text`, but will convert values of those two column into strings (excluding the first values)
-    """
-    feedback = """
-    
-**Value type check**:
-    
-"""
-    try:
-        # Proposition
-        feedback += '' if len(df.Proposition) == len(set(df.Proposition)) else 'Make sure no overlap or "NA" exists in "Proposition" column.  '
-        # Responds To
-        falling_out = set(df['Responds To'][1:]) - set(df.Proposition)
-        feedback += "" if falling_out == set() else f'"Responds To" column {"has" if len(falling_out)==1 else "have"} {[v for v in falling_out]} that does not exist in "Proposition" column.  '
-        # Relation Type
-        lower_relation_type_set = set([str.lower(v) for v in df['Relation Type'][1:]])
-        diff_relation_type_set = lower_relation_type_set - {'t', 'p', 'b'}
-        feedback += "" if diff_relation_type_set == set() else f'"Relation Type" column {"has" if len(diff_relation_type_set) == 1 else "have"} {[v for v in falling_out]} that does not fit. The relation can only be one of "T" (narrowly on-Topic), "P" (Parallel shift), and "B" (Break).  '
-        # Distance
-        for i in range(1, len(df['Relation Type'])):
-            if str.lower(df['Relation Type'][i]) == 't':
-                feedback += "" if df['Distance'][i] == 0 else f"The {i}{'st' if str(i)[-1] == '1' else ('nd' if str(i)[-1] == '2' else ('rd' if str(i)[-1] == '3' else 'th'))} row's relation type and distance mismatch.  "
-            elif str.lower(df['Relation Type'][i]) == 'p':
-                feedback += "" if df['Distance'][i] in [1, 2, 3] else f"The {i}{'st' if str(i)[-1] == '1' else ('nd' if str(i)[-1] == '2' else ('rd' if str(i)[-1] == '3' else 'th'))} row's relation type and distance mismatch.  "
-            elif str.lower(df['Relation Type'][i]) == 'b':
-                feedback += "" if df['Distance'][i] == 4 else f"The {i}{'st' if str(i)[-1] == '1' else ('nd' if str(i)[-1] == '2' else ('rd' if str(i)[-1] == '3' else 'th'))} row's relation type and distance mismatch.  "
-            else:
-                pass
-        # Dotted Line
-        # dotted_line_str = [v for v in df['Dotted Line'].astype(str)]
-        dotted_line_str = [v for v in df['Line Type'].astype(str)]
-        # for i in range(0, len(df['Dotted Line'])):
-        for i in range(0, len(df['Line Type'])):
-            feedback += "" if dotted_line_str[i] in ['1', '0', '1.0', '0.0'] else f'''The {i}{'st' if str(i)[-1] == '1' else ('nd' if str(i)[-1] == '2' else ('rd' if str(i)[-1] == '3' else 'th'))} row's dotted line is specified incorrectly. Use "1" to indicate a tenuous connection between propositions and "0" otherwise. If the field is not going to use, specify all values as 0.'''
-    except:
-        pass
-    feedback += "Looks good." if feedback == """
-    
-**Value type check**:
-    
-""" else ""
-    return feedback
-
-def check_order(df):
-    """
-    Checks if value in `Responds To` appears before `Proposition`.
-    """
-    feedback = """"""
+    arrays = layout_arrays(df) if arrays is None else arrays
+    counts = Counter()
+    violations = []
+    for check in CHECKS:
+        for rule, column, rows in check(df, arrays):
+            if rows is None:
+                counts[rule] += 1
+                violations.append(Violation(None, column, rule))
+                continue
+            if len(rows):
+                counts[rule] += len(rows)
+                # no rule can contribute more than the cap
+                violations.extend(Violation(int(row), column, rule) for row in rows[:max_violations])
+    violations.sort(key=lambda violation: -1 if violation.row is None else violation.row)
+    return ValidationReport(violations[:max_violations], counts, max_violations)
+
+
+def validate_and_build(df, max_violations=MAX_VIOLATIONS, **kwargs):
+    """
+    Validates `df` and lays it out from the same column arrays, so an upload is scanned once on its way to a figure.
+    :param kwargs: passed on to DTA
+    :return: (a processed DTA, None if `df` cannot be laid out; a ValidationReport). Without `Speaker` or `Text`, a
+             DTA is still returned and drawn with blank labels.
+    """
+    arrays = layout_arrays(df)
+    report = validate(df, max_violations, arrays)
+    dta = DTA(df, **kwargs)
     try:
-        proposition = list(df.Proposition[1:].astype(str))
-        respondsto = list(df['Responds To'][1:].astype(str))
-
-        for i, v in enumerate(proposition):
-            for j, u in enumerate(respondsto):
-                if u == v and j < i:
-                    feedback += f'''"Responds To" value {u} (in the {j+3}{'st' if str(i)[-1] == '1' else ('nd' if str(i)[-1] == '2' else ('rd' if str(i)[-1] == '3' else 'th'))} row) appears ealier than its corresponding "Propostion" value {v}, double check it.'''
-                elif u == v and j == i:
-                    feedback += f'''"Responds To" value {u} (in the {j+3}{'st' if str(i)[-1] == '1' else ('nd' if str(i)[-1] == '2' else ('rd' if str(i)[-1] == '3' else 'th'))} row) and its corresponding "Propostion" value {v} appear at the same row, double check it.'''
-                else:
-                    pass
-    except:
-        pass
-    feedback += "" if feedback == "" else ''' Please make sure the corresponding value in "Propostion" appears before the value in "Responds To".'''
-    return feedback
-
+        dta.process_nodes(arrays)
+        dta.process_edges(arrays)
+    except (KeyError, TypeError, ValueError):
+        # the report says why
+        dta = None
+    return dta, report
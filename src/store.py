@@ -0,0 +1,75 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+This module holds the server-side store of parsed uploads.
+"""
+
+
+import os
+import re
+import time
+
+import pandas as pd
+
+from src.cache import LRUCache
+from src.files import atomic_path, private_directory
+
+# tokens come back from the browser, only accept what `content_hash` produces before touching the disk
+TOKEN_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+
+class UploadStore(object):
+    """
+    Keeps parsed uploads on the server so the browser only carries a short token.
+    Frames are held in memory (LRU, bounded by size) and pickled to a local directory, which lets every worker
+    process serving the app find an upload whichever worker parsed it. `directory` has to be private to the user
+    serving the app, see `files.private_directory`.
+    """
+
+    def __init__(self, directory, max_bytes, max_age=24 * 60 * 60):
+        self.directory = private_directory(directory)
+        self.max_age = max_age
+        self.memory = LRUCache(max_bytes)
+
+    def _path(self, token):
+        return os.path.join(self.directory, f'{token}.pkl')
+
+    def put(self, token, df):
+        """
+        Stores `df` under `token`, a `content_hash`.
+        """
+        if not TOKEN_PATTERN.fullmatch(token):
+            raise ValueError(f'Malformed upload token: {token!r}')
+        self.memory.put(token, df, int(df.memory_usage(deep=True).sum()))
+        with atomic_path(self._path(token)) as tmp_path:
+            df.to_pickle(tmp_path)
+        self.prune()
+
+    def get(self, token):
+        """
+        Returns the frame stored under `token`, None if it is unknown or expired.
+        """
+        if not isinstance(token, str) or not TOKEN_PATTERN.fullmatch(token):
+            return None
+        df = self.memory.get(token)
+        if df is not None:
+            return df
+        try:
+            df = pd.read_pickle(self._path(token))
+        except (OSError, ValueError):
+            return None
+        self.memory.put(token, df, int(df.memory_usage(deep=True).sum()))
+        return df
+
+    def prune(self):
+        """
+        Deletes pickles older than `max_age` seconds.
+        """
+        expiry = time.time() - self.max_age
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.stat().st_mtime < expiry:
+                    os.remove(entry.path)
+            except OSError:
+                # removed by another worker
+                pass
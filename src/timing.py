@@ -0,0 +1,209 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+This module holds per-stage timing of the upload/render pipeline: wall time, row count, and (optionally) allocated
+memory per stage, logged as JSON lines and kept as histograms that `prometheus_text` reports.
+
+Set VISUALDTA_TIMING before the app starts:
+    unset or 0: off; `timed` returns functions unchanged and `stage` is a shared no-op, so there is no overhead
+    1: wall time and rows
+    memory: also peak memory allocated within each stage, through tracemalloc (slows everything down, for profiling)
+"""
+
+
+import os
+import json
+import time
+import logging
+import functools
+import threading
+import tracemalloc
+
+TIMING = os.environ.get('VISUALDTA_TIMING', '0')
+ENABLED = TIMING in ('1', 'memory')
+TRACE_MEMORY = TIMING == 'memory'
+# histogram bucket upper bounds, in seconds and in bytes
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = tuple(2 ** power for power in range(16, 34, 2))
+
+logger = logging.getLogger(__name__)
+if ENABLED and not logger.handlers:
+    # one JSON object per line on stderr, whatever the app's logging setup
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+class Histogram(object):
+    """
+    Cumulative-bucket histogram, as Prometheus exposes them.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class StageMetrics(object):
+    """
+    Per-stage histograms of wall time and allocated memory, and row totals. Safe to share between threads.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self.memory = {}
+        self.rows = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds, rows=None, nbytes=None):
+        with self._lock:
+            self.seconds.setdefault(stage, Histogram(SECONDS_BUCKETS)).observe(seconds)
+            if rows is not None:
+                self.rows[stage] = self.rows.get(stage, 0) + rows
+            if nbytes is not None:
+                self.memory.setdefault(stage, Histogram(BYTES_BUCKETS)).observe(nbytes)
+
+    def prometheus_text(self):
+        """
+        Formats the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            for name, help_text, histograms in [
+                    ('visualdta_stage_seconds', 'Wall time per pipeline stage.', self.seconds),
+                    ('visualdta_stage_memory_bytes', 'Peak memory allocated per pipeline stage.', self.memory)]:
+                if not histograms:
+                    continue
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for stage, histogram in sorted(histograms.items()):
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum}')
+                    lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+            if self.rows:
+                lines.append('# HELP visualdta_stage_rows_total Rows processed per pipeline stage.')
+                lines.append('# TYPE visualdta_stage_rows_total counter')
+                for stage, rows in sorted(self.rows.items()):
+                    lines.append(f'visualdta_stage_rows_total{{stage="{stage}"}} {rows}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = StageMetrics()
+# tracemalloc.reset_peak is new in Python 3.9; before that, the peak is reset by restarting tracing, see `Stage`
+_reset_peak = getattr(tracemalloc, 'reset_peak', None)
+# enclosing stages of the current thread: [memory at start, highest peak seen], see `Stage`
+_stack = threading.local()
+
+
+class Stage(object):
+    """
+    Times the block it wraps as `name`. Set `rows` inside the block to record how many rows it handled.
+    With TRACE_MEMORY, nested stages pass their peaks up, since tracemalloc only keeps one peak per process; threads
+    running stages at the same time still see each other's allocations. Without `tracemalloc.reset_peak` (Python 3.8),
+    the peak is only reset by an outermost stage, which restarts tracing, so a nested stage reports the highest peak
+    since then, an upper bound.
+    """
+
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        if TRACE_MEMORY:
+            stack = _stack.__dict__.setdefault('stages', [])
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1][1] = max(stack[-1][1], peak)
+            if _reset_peak is not None:
+                _reset_peak()
+                peak = current
+            elif not stack:
+                tracemalloc.stop()
+                tracemalloc.start()
+                current = peak = 0
+            stack.append([current, peak])
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.start
+        nbytes = None
+        if TRACE_MEMORY:
+            stack = _stack.stages
+            start, highest = stack.pop()
+            highest = max(highest, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1][1] = max(stack[-1][1], highest)
+            # tracing restarted by another thread's stage forgets what was allocated before
+            nbytes = max(highest - start, 0)
+        metrics.observe(self.name, seconds, self.rows, nbytes)
+        logger.info(json.dumps({'stage': self.name,
+                                'seconds': round(seconds, 6),
+                                'rows': self.rows,
+                                'bytes': nbytes,
+                                'failed': exc_type is not None}))
+        return False
+
+
+class _NoStage(object):
+    """
+    Stands in for `Stage` when timing is off.
+    """
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def __setattr__(self, name, value):
+        # shared by every caller, keep it stateless
+        pass
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name, rows=None):
+    """
+    Times a block: `with stage('to_json', rows=n): ...`
+    """
+    return Stage(name, rows) if ENABLED else _NO_STAGE
+
+
+def timed(name, rows=None):
+    """
+    Decorates a function to time each call as stage `name`; returns the function unchanged when timing is off.
+    :param rows: called with the function's result and arguments to count the rows handled, optional
+    """
+    def decorate(function):
+        if not ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with Stage(name) as timer:
+                result = function(*args, **kwargs)
+                if rows is not None:
+                    timer.rows = rows(result, *args, **kwargs)
+            return result
+        return wrapper
+    return decorate
+
+
+if TRACE_MEMORY and not tracemalloc.is_tracing():
+    tracemalloc.start()
@@ -0,0 +1,14 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+This module holds shared test setup: run from the repository root with `python -m pytest tests`.
+"""
+
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# demos are not laid out in the background when app is imported for tests
+os.environ.setdefault('VISUALDTA_PRELOAD_DEMOS', '0')
@@ -0,0 +1,80 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+This module holds tests of the app's callbacks.
+"""
+
+
+import os
+
+import pytest
+from dash.exceptions import PreventUpdate
+
+import app
+from src import payload
+from benchmarks.synthetic import make_transcript
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RELAYOUTS = [{'yaxis.range[0]': 10, 'yaxis.range[1]': 40}, {'yaxis.autorange': True}]
+
+
+def store_upload(rows, laid_out=True):
+    """
+    Stores a synthetic upload as `process_upload` does, returning its token.
+    """
+    df = make_transcript(rows)
+    token = app.content_hash('test upload', rows, laid_out)
+    app.upload_store.put(token, df)
+    # otherwise the layout was evicted, or made by another worker
+    app.layout_cache.clear()
+    if laid_out:
+        dta = app.lay_out(df)
+        app.layout_cache.put(token, dta, app.layout_size(dta))
+    return token
+
+
+@pytest.mark.parametrize('laid_out', [True, False])
+@pytest.mark.parametrize('relayout_data', RELAYOUTS)
+def test_small_upload_is_not_windowed_on_relayout(laid_out, relayout_data):
+    token = store_upload(90, laid_out)
+    with pytest.raises(PreventUpdate):
+        app.pan_uploaded.__wrapped__(relayout_data, token, 'Show Text')
+
+
+@pytest.mark.parametrize('laid_out', [True, False])
+def test_long_upload_is_windowed_on_relayout(laid_out):
+    token = store_upload(app.WINDOW_THRESHOLD + 1, laid_out)
+    figure = app.pan_uploaded.__wrapped__(RELAYOUTS[0], token, 'Show Text')
+    assert isinstance(figure, payload.RawFigure)
+
+
+def test_laid_out_relays_out_evicted_uploads_only():
+    token = store_upload(90, laid_out=False)
+    dta = app.laid_out(token)
+    assert dta is not None and len(dta.positions) == 90
+    assert app.laid_out(token) is dta
+    assert app.laid_out('never uploaded') is None
+    token = app.content_hash('test upload', 'no layout')
+    app.upload_store.put(token, make_transcript(90).drop(columns='Responds To'))
+    assert app.laid_out(token) is None
+    with pytest.raises(PreventUpdate):
+        app.visualize_uploaded.__wrapped__(1, token, 'Show Text')
+
+
+@pytest.mark.parametrize('name', sorted(app.DEMOS))
+def test_shipped_demos_load_and_are_cached(monkeypatch, name):
+    monkeypatch.chdir(ROOT)
+    app.demo_cache.pop(name, None)
+    graph, *metrics = app.visualize_demo.__wrapped__(name, 'Show Text')
+    assert isinstance(graph.figure, payload.RawFigure)
+    assert name in app.demo_cache
+    assert app.load_demo(name) is app.demo_cache[name][1]
+
+
+def test_unreadable_demo_raises(monkeypatch, tmp_path):
+    path = tmp_path / 'broken.xlsx'
+    path.write_bytes(b'not a workbook')
+    monkeypatch.setitem(app.DEMOS, 'broken', str(path))
+    with pytest.raises(ValueError):
+        app.load_demo('broken')
+    assert 'broken' not in app.demo_cache
@@ -0,0 +1,66 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+This module holds tests of the batch pipeline.
+"""
+
+
+import os
+
+import pytest
+import pandas as pd
+
+from src import batch, static
+from benchmarks.synthetic import make_transcript
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('suffix, sep', [('.csv', ','), ('.tsv', '\t'), ('.txt', '\t')])
+def test_text_transcripts_are_processed(tmp_path, suffix, sep):
+    path = tmp_path / f'transcript{suffix}'
+    make_transcript(200).to_csv(path, sep=sep, index=False)
+    assert batch.find_transcripts(str(tmp_path)) == [str(path)]
+    record = batch.process_transcript(str(path))
+    assert record['error'] is None
+    assert record['propositions'] == 200
+
+
+def test_mac_roman_transcript_is_processed():
+    record = batch.process_transcript(os.path.join(ROOT, 'samples', 'IM-conv.txt'))
+    assert record['error'] is None
+    assert record['propositions'] == 76
+
+
+def test_read_error_reaches_error_column(tmp_path):
+    path = tmp_path / 'transcript.csv'
+    make_transcript(20).drop(columns='Responds To').to_csv(path, index=False)
+    assert batch.process_transcript(str(path))['error'] == "KeyError: 'Responds To'"
+    path = tmp_path / 'transcript.doc'
+    path.write_bytes(b'')
+    assert batch.process_transcript(str(path))['error'] == "ValueError: unsupported suffix '.doc'"
+
+
+def test_legacy_excel_is_read_in():
+    pytest.importorskip('xlrd')
+    path = os.path.join(ROOT, 'samples', 'IM-conv.xls')
+    assert isinstance(static.read_in_demo(path, os.path.basename(path)), pd.DataFrame)
+
+
+def test_cache_dir_round_trip(tmp_path):
+    path = os.path.join(ROOT, 'samples', 'template.xlsx')
+    cache_dir = str(tmp_path / 'cache')
+    first = static.read_excel_fast(path, cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+    assert static.read_excel_fast(path, cache_dir=cache_dir).equals(first)
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid'), reason='needs POSIX owners and modes')
+def test_shared_cache_dir_is_refused(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    cache_dir.mkdir()
+    cache_dir.chmod(0o777)
+    with pytest.raises(PermissionError):
+        static.read_excel_fast(os.path.join(ROOT, 'samples', 'template.xlsx'), cache_dir=str(cache_dir))
+    with pytest.raises(PermissionError):
+        batch.run([os.path.join(ROOT, 'samples', 'template.xlsx')], cache_dir=str(cache_dir))
@@ -0,0 +1,62 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+This module holds tests of the size-bounded LRU cache.
+"""
+
+
+from src.cache import LRUCache, content_hash
+
+
+def test_least_recently_used_is_evicted_first():
+    cache = LRUCache(30)
+    for key in 'abc':
+        cache.put(key, key.upper(), 10)
+    # reading 'a' makes 'b' the least recently used
+    assert cache.get('a') == 'A'
+    cache.put('d', 'D', 10)
+    assert 'b' not in cache
+    assert [key for key in 'acd' if key in cache] == ['a', 'c', 'd']
+    # a value big enough to need two slots evicts the two least recently used
+    cache.put('e', 'E', 20)
+    assert 'a' not in cache and 'c' not in cache
+    assert 'd' in cache and 'e' in cache
+    assert cache.current_bytes == 30
+
+
+def test_replacing_a_key_updates_its_size():
+    cache = LRUCache(30)
+    cache.put('a', 1, 10)
+    cache.put('a', 2, 25)
+    assert cache.get('a') == 2
+    assert len(cache) == 1 and cache.current_bytes == 25
+
+
+def test_oversized_value_is_refused():
+    cache = LRUCache(30)
+    cache.put('a', 'A', 10)
+    cache.put('big', 'BIG', 31)
+    assert 'big' not in cache
+    # refusing it evicts nothing
+    assert 'a' in cache and cache.current_bytes == 10
+    # nor is a stored key kept at its old value once replaced by an oversized one
+    cache.put('a', 'huge', 31)
+    assert 'a' not in cache and cache.current_bytes == 0
+
+
+def test_stats_count_hits_misses_and_evictions():
+    cache = LRUCache(20)
+    cache.put('a', 'A', 10)
+    cache.put('b', 'B', 10)
+    cache.get('a')
+    cache.get('missing')
+    assert cache.get('missing', 'default') == 'default'
+    cache.put('c', 'C', 10)
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'evictions': 1, 'entries': 2, 'bytes': 20, 'max_bytes': 20}
+    cache.clear()
+    assert cache.stats()['entries'] == 0 and cache.stats()['bytes'] == 0
+
+
+def test_content_hash_separates_parts():
+    assert content_hash('ab', 'c') != content_hash('a', 'bc')
+    assert content_hash('a', 1) == content_hash('a', '1')
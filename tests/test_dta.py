@@ -0,0 +1,86 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+This module holds regression tests of the DTA layout against tests/fixtures/colbert_baseline.json: positions, metrics,
+traces, and annotations that the original row-by-row implementation produced for one of the samples.
+Two changes to the node traces are deliberate: they are drawn in RELATION_TYPES order whatever the text switch, and
+the root is no longer drawn twice when it is coded PR. Traces are compared by name, and the baseline's second root
+marker is dropped, see `baseline_traces`.
+"""
+
+
+import os
+import json
+
+import pytest
+import pandas as pd
+
+from src import payload
+from src.dta import DTA, RELATION_TYPES, ROOT_RELATION_TYPE
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+with open(os.path.join(ROOT, 'tests', 'fixtures', 'colbert_baseline.json'), encoding='utf-8') as f:
+    BASELINE = json.load(f)
+SWITCHES = {'show_text': True, 'hide_text': False}
+
+
+@pytest.fixture(scope='module')
+def df():
+    return pd.read_excel(os.path.join(ROOT, BASELINE['source']))
+
+
+@pytest.fixture(scope='module')
+def dta(df):
+    dta = DTA(df)
+    dta.process_nodes()
+    dta.process_edges()
+    return dta
+
+
+def baseline_traces(key):
+    """
+    The baseline's traces by name, the root drawn once.
+    """
+    traces = {trace['name']: dict(trace) for trace in BASELINE[key]['data']}
+    prompt = traces[RELATION_TYPES[ROOT_RELATION_TYPE]['name']]
+    # the root was drawn first, and again as the first PR
+    assert prompt['x'][:2] == [prompt['x'][0]] * 2 and prompt['y'][:2] == [prompt['y'][0]] * 2
+    prompt['x'], prompt['y'] = prompt['x'][1:], prompt['y'][1:]
+    return traces
+
+
+def check_figure(figure, key):
+    traces = {trace['name']: trace for trace in figure['data']}
+    assert len(traces) == len(figure['data'])
+    assert traces == baseline_traces(key)
+    assert figure['layout'].get('annotations', []) == BASELINE[key]['annotations']
+
+
+def test_positions_and_metrics_match_baseline(dta):
+    assert dta.positions.tolist() == BASELINE['positions']
+    assert [dta.accumulated_semantic_distance, dta.mean_semantic_distance,
+            dta.mean_semantic_distance_only_for_P] == BASELINE['metrics']
+
+
+@pytest.mark.parametrize('key', sorted(SWITCHES))
+def test_figure_dict_matches_baseline(dta, key):
+    check_figure(json.loads(payload.encode_figure(dta.figure_dict(SWITCHES[key]))), key)
+
+
+@pytest.mark.parametrize('key', sorted(SWITCHES))
+def test_draw_graph_matches_baseline(dta, key):
+    check_figure(json.loads(dta.draw_graph(SWITCHES[key]).to_json()), key)
+
+
+def test_input_frame_is_left_untouched(df, dta):
+    assert 'Pos' not in df and 'Pos' not in dta.df
+    with pytest.raises(ValueError):
+        dta.positions[0, 0] = 1.0
+
+
+def test_cached_arrays_are_read_only(dta):
+    arrays = ([dta.edge_x, dta.edge_y, dta.edge_dotted_x, dta.edge_dotted_y, dta.edge_noline_x, dta.edge_noline_y] +
+              list(dta.node_groups.values()) + list(dta.node_group_rows.values()))
+    for array in arrays:
+        with pytest.raises(ValueError):
+            array[:1] = 0
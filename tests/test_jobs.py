@@ -0,0 +1,92 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+This module holds tests of background upload jobs.
+"""
+
+
+import os
+import time
+import threading
+
+import pytest
+
+from src import jobs
+from src.cache import content_hash
+
+
+def wait(runner, token, timeout=5.0):
+    """
+    Polls a job until it is no longer running.
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = runner.status(token)
+        if status['state'] != 'running':
+            return status
+        time.sleep(0.01)
+    raise AssertionError(f'job {token} still running')
+
+
+def test_job_reports_progress_then_result(tmp_path):
+    runner = jobs.JobRunner(str(tmp_path / 'jobs'))
+    token = content_hash('progress')
+    started, release = threading.Event(), threading.Event()
+
+    def job(rows, progress):
+        progress('parsing', 0.5)
+        started.set()
+        release.wait(5)
+        return {'rows': rows}
+
+    runner.submit(token, job, 10)
+    assert started.wait(5)
+    assert runner.status(token) == {'state': 'running', 'stage': 'parsing', 'fraction': 0.5}
+    # a poll reaching another worker process reads the same state
+    assert jobs.JobRunner(str(tmp_path / 'jobs')).status(token)['stage'] == 'parsing'
+    release.set()
+    assert wait(runner, token) == {'state': 'done', 'result': {'rows': 10}}
+
+
+def test_failed_job_reports_error(tmp_path):
+    runner = jobs.JobRunner(str(tmp_path / 'jobs'))
+    token = content_hash('failure')
+
+    def job(progress):
+        raise ValueError('bad upload')
+
+    runner.submit(token, job)
+    assert wait(runner, token) == {'state': 'failed', 'error': 'ValueError: bad upload'}
+
+
+def test_running_job_is_not_submitted_twice(tmp_path):
+    runner = jobs.JobRunner(str(tmp_path / 'jobs'))
+    token = content_hash('twice')
+    release = threading.Event()
+    calls = []
+
+    def job(progress):
+        calls.append(1)
+        release.wait(5)
+        return len(calls)
+
+    runner.submit(token, job)
+    runner.submit(token, job)
+    release.set()
+    assert wait(runner, token) == {'state': 'done', 'result': 1}
+    assert calls == [1]
+
+
+def test_unknown_malformed_and_stale_tokens(tmp_path):
+    runner = jobs.JobRunner(str(tmp_path / 'jobs'))
+    assert runner.status(content_hash('never submitted')) is None
+    assert runner.status('../../etc/passwd') is None
+    assert runner.status(None) is None
+    with pytest.raises(ValueError):
+        runner.submit('../../etc/passwd', lambda progress: None)
+    # a job whose progress stopped moving, e.g. in a worker that was restarted
+    token = content_hash('stale')
+    runner._write(token, {'state': 'running', 'stage': 'parsing', 'fraction': 0.1})
+    old = time.time() - jobs.JOB_TIMEOUT - 1
+    os.utime(runner._path(token), (old, old))
+    assert runner.status(token)['state'] == 'failed'
@@ -0,0 +1,123 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+This module holds tests of reading in and checking transcripts.
+"""
+
+
+import base64
+
+import pytest
+import pandas as pd
+
+from src import static
+from benchmarks.synthetic import make_transcript
+
+
+def late_non_ascii_csv():
+    """
+    A cp1252 transcript whose only non-ASCII byte comes after the bytes chardet looks at.
+    """
+    df = make_transcript(5000)
+    df.loc[len(df) - 1, 'Text'] = 'café'
+    data = df.to_csv(index=False).encode('cp1252')
+    assert data.index('é'.encode('cp1252')) > static.ENCODING_SAMPLE_BYTES
+    return data
+
+
+def test_detect_encoding_decodes_late_non_ascii():
+    data = late_non_ascii_csv()
+    for incremental in [True, False]:
+        encoding, path = static.detect_encoding(data, incremental=incremental)
+        assert data.decode(encoding).endswith('café\n')
+
+
+def test_upload_with_late_non_ascii_is_read_in():
+    contents = 'data:text/csv;base64,' + base64.b64encode(late_non_ascii_csv()).decode()
+    df = static.read_in_uploaded(contents, 'late.csv')
+    assert isinstance(df, pd.DataFrame)
+    assert df.Text.iat[-1] == 'café'
+
+
+def test_detect_encoding_keeps_utf8():
+    assert static.detect_encoding('café'.encode('utf-8')) == ('utf-8', 'utf-8')
+
+
+def transcript():
+    """
+    A small valid transcript, one row of each relation type.
+    """
+    return pd.DataFrame({'Proposition': [1, 2, 3, 4, 5],
+                         'Speaker': ['A', 'B', 'A', 'B', 'A'],
+                         'Responds To': [None, 1, 2, 3, 4],
+                         'Relation Type': [None, 'T', 'P', 'B', 'X'],
+                         'Distance': [None, 0, 2, 4, 1],
+                         'Line Type': [None, 1, 2, 0, 1],
+                         'Text': ['a', 'b', 'c', 'd', 'e']})
+
+
+def broken(column, row, value):
+    df = transcript()
+    df[column] = df[column].astype(object)
+    df.loc[row, column] = value
+    return df
+
+
+def test_validate_passes_valid_transcript():
+    report = static.validate(transcript())
+    assert report.ok and report.total == 0 and report.violations == []
+    assert 'Looks good.' in report.to_markdown()
+
+
+@pytest.mark.parametrize('df, violation', [
+    (transcript().drop(columns='Speaker'), static.Violation(None, 'Speaker', 'missing_heading')),
+    (transcript().head(1), static.Violation(None, 'Proposition', 'too_short')),
+    (broken('Speaker', 3, None), static.Violation(3, 'Speaker', 'blank')),
+    (broken('Distance', 0, 0), static.Violation(0, 'Distance', 'root_not_blank')),
+    (broken('Proposition', 4, 2), static.Violation(4, 'Proposition', 'duplicate')),
+    (broken('Responds To', 2, 9), static.Violation(2, 'Responds To', 'unknown_parent')),
+    (broken('Responds To', 2, 4), static.Violation(2, 'Responds To', 'forward_reference')),
+    (broken('Relation Type', 2, 'Q'), static.Violation(2, 'Relation Type', 'relation_type')),
+    (broken('Distance', 1, 3), static.Violation(1, 'Distance', 'distance')),
+    (broken('Line Type', 1, 'maybe'), static.Violation(1, 'Line Type', 'line_type')),
+])
+def test_validate_flags_each_rule(df, violation):
+    report = static.validate(df)
+    assert violation in report.violations
+    assert report.counts[violation.rule] == 1
+    assert static.RULES[violation.rule] in report.to_markdown()
+
+
+def test_validate_caps_listed_violations_but_counts_all():
+    df = make_transcript(50)
+    df['Speaker'] = df['Speaker'].astype(object)
+    df.loc[10:, 'Speaker'] = None
+    assert static.validate(make_transcript(50)).ok
+    report = static.validate(df, max_violations=3)
+    assert report.counts == {'blank': 40}
+    assert report.total == 40
+    assert [violation.row for violation in report.violations] == [10, 11, 12]
+    assert '... and 37 more.' in report.to_markdown()
+
+
+def test_lower_case_relation_types_are_drawn_and_counted():
+    df = transcript()
+    df['Relation Type'] = [None, 't', ' p ', 'b', 'x']
+    dta, report = static.validate_and_build(df)
+    assert report.ok
+    rows = {code: block.tolist() for code, block in dta.node_group_rows.items()}
+    assert rows == {'PR': [0], 'T': [1], 'P': [2], 'B': [3], 'X': [4]}
+    assert dta.mean_semantic_distance_only_for_P == dta.positions[2, 0]
+    assert set(dta.metrics.by_relation_type) == {'T', 'P', 'B', 'X'}
+
+
+@pytest.mark.parametrize('heading', sorted(static.HEADINGS))
+def test_missing_heading_is_reported_and_never_breaks_drawing(heading):
+    dta, report = static.validate_and_build(transcript().drop(columns=heading))
+    assert report.counts == {'missing_heading': 1}
+    if heading in ('Speaker', 'Text'):
+        for high_volume in [False, True]:
+            assert dta.figure_dict(True, high_volume)['data']
+        assert dta.annotations()[1]['hovertext'] == ('' if heading == 'Speaker' else 'B')
+    else:
+        assert dta is None
@@ -0,0 +1,49 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+This module holds tests of the server-side upload store.
+"""
+
+
+import os
+
+import pytest
+
+from src.cache import content_hash
+from src.files import private_directory
+from src.store import UploadStore
+from benchmarks.synthetic import make_transcript
+
+posix = pytest.mark.skipif(not hasattr(os, 'getuid'), reason='needs POSIX owners and modes')
+
+
+def test_round_trip_through_disk(tmp_path):
+    df = make_transcript(50)
+    token = content_hash('round trip')
+    UploadStore(str(tmp_path / 'uploads'), 1 << 20).put(token, df)
+    # another worker process, with nothing in memory
+    stored = UploadStore(str(tmp_path / 'uploads'), 1 << 20).get(token)
+    assert stored.equals(df)
+
+
+def test_new_directory_is_private(tmp_path):
+    directory = private_directory(str(tmp_path / 'uploads'))
+    if hasattr(os, 'getuid'):
+        assert os.stat(directory).st_mode & 0o777 == 0o700
+
+
+@posix
+def test_shared_directory_is_refused(tmp_path):
+    directory = tmp_path / 'uploads'
+    directory.mkdir()
+    directory.chmod(0o777)
+    with pytest.raises(PermissionError):
+        UploadStore(str(directory), 1 << 20)
+
+
+@posix
+def test_symlinked_directory_is_refused(tmp_path):
+    (tmp_path / 'elsewhere').mkdir(mode=0o700)
+    (tmp_path / 'uploads').symlink_to(tmp_path / 'elsewhere')
+    with pytest.raises(PermissionError):
+        private_directory(str(tmp_path / 'uploads'))
@@ -0,0 +1,107 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+This module holds tests of laying out propositions as they arrive (`DTA.append` and `DTA.extend`) against laying out
+the whole transcript at once.
+"""
+
+
+import numpy as np
+import pytest
+
+from src import static
+from src.dta import DTA
+from benchmarks.synthetic import make_transcript
+
+EDGES = [('edge_x', 'edge_y'), ('edge_dotted_x', 'edge_dotted_y'), ('edge_noline_x', 'edge_noline_y')]
+
+
+@pytest.fixture(scope='module')
+def df():
+    return make_transcript(600, seed=1)
+
+
+@pytest.fixture(scope='module')
+def batch(df):
+    dta = DTA(df, y_mode='stream')
+    dta.process_nodes()
+    dta.process_edges()
+    return dta
+
+
+def segments(dta, x, y):
+    """
+    The [start, end] segments of one line type, as a sorted list; appended edges may come in another order.
+    """
+    x, y = getattr(dta, x), getattr(dta, y)
+    return sorted(zip(x[0::3].tolist(), x[1::3].tolist(), y[0::3].tolist(), y[1::3].tolist()))
+
+
+def test_edges_grow_in_place_between_draws(df, batch):
+    dta = DTA(y_mode='stream')
+    dta.extend(df.iloc[:200])
+    dta.edge_x
+    for i in range(200, 400):
+        dta.append(df.iloc[i].to_dict())
+        if i % 50 == 0:
+            dta.edge_x
+    dta.extend(df.iloc[400:])
+    for x, y in EDGES:
+        assert segments(dta, x, y) == segments(batch, x, y)
+
+
+def append_rows(df):
+    dta = DTA(y_mode='stream')
+    for row in df.to_dict('records'):
+        dta.append(row)
+    return dta
+
+
+def extend_list(df):
+    dta = DTA(y_mode='stream')
+    dta.extend(df.to_dict('records'))
+    return dta
+
+
+def extend_chunks(df):
+    dta = DTA(y_mode='stream')
+    for start in range(0, len(df), 128):
+        dta.extend(static.compact_dtypes(df.iloc[start:start + 128].copy()))
+    return dta
+
+
+def mixed(df):
+    # a drawn DTA keeps growing what it drew
+    dta = DTA(y_mode='stream')
+    dta.extend(df.iloc[:100])
+    dta.figure_dict(True)
+    for row in df.iloc[100:300].to_dict('records'):
+        dta.append(row)
+    dta.figure_dict(False, high_volume=True)
+    dta.extend(df.iloc[300:450])
+    dta.extend(df.iloc[450:].to_dict('records'))
+    return dta
+
+
+@pytest.mark.parametrize('stream', [append_rows, extend_list, extend_chunks, mixed])
+def test_streamed_layout_equals_batch(df, batch, stream):
+    dta = stream(df)
+    assert np.array_equal(dta.positions, batch.positions)
+    for code in batch.relation_types:
+        assert np.array_equal(dta.node_group_rows[code], batch.node_group_rows[code])
+        assert np.array_equal(dta.node_groups[code], batch.node_groups[code])
+    for x, y in EDGES:
+        assert segments(dta, x, y) == segments(batch, x, y)
+    assert sorted(dta.graph.edges(data='line_type')) == sorted(batch.graph.edges(data='line_type'))
+    assert (dta.accumulated_semantic_distance, dta.mean_semantic_distance, dta.mean_semantic_distance_only_for_P) == \
+           (batch.accumulated_semantic_distance, batch.mean_semantic_distance, batch.mean_semantic_distance_only_for_P)
+    assert dta.annotations() == batch.annotations()
+    assert dta.hover_text().tolist() == batch.hover_text().tolist()
+    streamed, laid_out = dta.figure_dict(True), batch.figure_dict(True)
+    for a, b in zip(streamed['data'][:len(batch.relation_types)], laid_out['data'][:len(batch.relation_types)]):
+        assert a['name'] == b['name']
+        assert np.array_equal(a['x'], b['x']) and np.array_equal(a['y'], b['y'])
+    # `df` is only merged when asked for
+    assert len(dta.df) == len(df)
+    for column in ['Proposition', 'Speaker', 'Relation Type', 'Text']:
+        assert dta.df[column].astype(object).fillna('').tolist() == df[column].astype(object).fillna('').tolist()
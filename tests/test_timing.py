@@ -0,0 +1,40 @@
+"""
+Author: Haining Wang hw56@indiana.edu
+
+This module holds tests of per-stage timing.
+"""
+
+
+import tracemalloc
+
+import pytest
+
+from src import timing
+
+
+@pytest.fixture
+def traced(monkeypatch):
+    """
+    Traces memory for one test, as VISUALDTA_TIMING=memory would.
+    """
+    monkeypatch.setattr(timing, 'TRACE_MEMORY', True)
+    monkeypatch.setattr(timing, 'metrics', timing.StageMetrics())
+    tracemalloc.start()
+    yield timing.metrics
+    tracemalloc.stop()
+
+
+@pytest.mark.parametrize('reset_peak', [getattr(tracemalloc, 'reset_peak', None), None])
+def test_nested_stages_report_their_peaks(traced, monkeypatch, reset_peak):
+    # None stands in for Python 3.8, which has no tracemalloc.reset_peak
+    monkeypatch.setattr(timing, '_reset_peak', reset_peak)
+    with timing.Stage('outer'):
+        with timing.Stage('inner'):
+            block = bytearray(4 * 2 ** 20)
+            del block
+        with timing.Stage('after'):
+            pass
+    outer, inner = traced.memory['outer'], traced.memory['inner']
+    assert outer.count == inner.count == 1
+    assert outer.sum >= inner.sum >= 4 * 2 ** 20
+    assert traced.memory['after'].sum >= 0